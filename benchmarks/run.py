@@ -0,0 +1,319 @@
+"""
+Benchmarks for the `VipsProcessor` operations and the full
+`ImageProcessing.save()` path.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --filter resize --sizes 1920x1080 --repeat 3
+    python benchmarks/run.py compare before.json after.json --threshold 0.1
+
+Synthetic fixtures are generated, in several resolutions and formats, in a
+temporary folder. Every case runs in a fresh process, so its peak RSS isn't
+affected by the other cases, and reports the median wall and CPU times of
+`--repeat` runs. libvips is lazy, so every pipeline case includes loading the
+source and encoding the result; the operations cases all start from a JPEG and
+save a JPEG, so they can be compared with the `save` baseline. The
+`processor.*` cases measure each `VipsProcessor` step on its own instead:
+decoding the source, applying an operation to the decoded image, and encoding
+it, so a regression in one of them isn't hidden by the others.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_SIZES = ["640x480", "1920x1080", "4000x3000"]
+FORMATS = ["jpeg", "png", "webp", "tiff"]
+
+# name: (function name, args, kwargs) applied to the pipeline
+OPERATIONS = {
+    "save": None,
+    "resize_to_limit": ("resize_to_limit", (400, 400), {}),
+    "resize_to_fit": ("resize_to_fit", (400, 400), {}),
+    "resize_to_fill": ("resize_to_fill", (400, 400), {}),
+    "resize_and_pad": ("resize_and_pad", (400, 400), {}),
+    "rotate_90": ("rotate", (90,), {}),
+    "rotate_45": ("rotate", (45,), {}),
+    "composite": ("composite", ("{watermark}",), {"gravity": "south-east"}),
+    "set": ("set", ("xres", 10.0), {}),
+    "remove": ("remove", ("exif-data",), {}),
+}
+
+
+def generate_fixtures(folder: Path, sizes: "list[str]") -> "dict[str, str]":
+    """Generate noisy, photo-like images of every size and format,
+    and a watermark with an alpha channel.
+    """
+    import pyvips
+
+    fixtures = {}
+    for size in sizes:
+        width, height = map(int, size.split("x"))
+        image = pyvips.Image.gaussnoise(width, height, mean=128, sigma=30)
+        gradient = pyvips.Image.xyz(width, height)[0] * (255 / width)
+        image = (image * 0.5 + gradient * 0.5).cast("uchar")
+        image = image.bandjoin(
+            [image.rot180().flip("horizontal"), gradient.cast("uchar")]
+        )
+        image = image.copy(interpretation="srgb")
+        for format in FORMATS:
+            path = folder / f"{size}.{format}"
+            image.write_to_file(str(path))
+            fixtures[f"{size}.{format}"] = str(path)
+
+    watermark = pyvips.Image.black(200, 80).new_from_image([255, 255, 255, 128])
+    watermark = watermark.copy(interpretation="srgb")
+    fixtures["watermark"] = str(folder / "watermark.png")
+    watermark.write_to_file(fixtures["watermark"])
+    return fixtures
+
+
+def get_cases(
+    fixtures: "dict[str, str]", sizes: "list[str]", filter: str = ""
+) -> "list[dict]":
+    cases = []
+    for size in sizes:
+        for operation in OPERATIONS:
+            cases.append({
+                "name": f"{operation}[{size}.jpeg->jpeg]",
+                "source": fixtures[f"{size}.jpeg"],
+                "operation": operation,
+                "format": "jpeg",
+            })
+        for source_format in FORMATS:
+            for format in FORMATS:
+                if source_format == format == "jpeg":
+                    continue  # already included above
+                cases.append({
+                    "name": f"resize_to_limit[{size}.{source_format}->{format}]",
+                    "source": fixtures[f"{size}.{source_format}"],
+                    "operation": "resize_to_limit",
+                    "format": format,
+                })
+        for operation in ("load", *OPERATIONS):
+            cases.append({
+                "name": f"processor.{operation}[{size}]",
+                "source": fixtures[f"{size}.jpeg"],
+                "operation": operation,
+                "processor": True,
+            })
+    for case in cases:
+        case["watermark"] = fixtures["watermark"]
+    return [case for case in cases if filter in case["name"]]
+
+
+def get_operation(case: dict) -> "tuple[str, tuple, dict]":
+    name, args, kw = OPERATIONS[case["operation"]]
+    args = tuple(
+        arg.format(watermark=case["watermark"]) if isinstance(arg, str) else arg
+        for arg in args
+    )
+    return name, args, kw
+
+
+def run_case(case: dict, repeat: int) -> dict:
+    """Run the case `repeat` times in this process and measure it."""
+    if case.get("processor"):
+        return run_processor_case(case, repeat)
+
+    from image_processing import ImageProcessing
+
+    baseline_rss = get_peak_rss()
+    pipeline = ImageProcessing(case["source"]).convert(case["format"])
+    if OPERATIONS[case["operation"]]:
+        name, args, kw = get_operation(case)
+        pipeline = getattr(pipeline, name)(*args, **kw)
+
+    walls = []
+    cpus = []
+    with tempfile.TemporaryDirectory() as folder:
+        destination = Path(folder) / f"result.{case['format']}"
+        for _ in range(repeat):
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            pipeline.save(destination)
+            cpus.append(time.process_time() - cpu)
+            walls.append(time.perf_counter() - wall)
+        size = destination.stat().st_size
+
+    return {
+        "wall": statistics.median(walls),
+        "cpu": statistics.median(cpus),
+        "peak_rss": get_peak_rss(),
+        "baseline_rss": baseline_rss,
+        "output_size": size,
+    }
+
+
+def run_processor_case(case: dict, repeat: int) -> dict:
+    """Measure a single `VipsProcessor` step: `load` decodes the source,
+    `save` encodes the decoded source to a JPEG and the other operations are
+    applied to the decoded source and computed in memory.
+    """
+    from image_processing.vips_processor import VipsProcessor
+    from image_processing.vips_processor import resolve_operation
+
+    processor = VipsProcessor()
+    source = case["source"]
+    image = processor._load_image(source).copy_memory()
+    if case["operation"] == "load":
+        def step():
+            # `revalidate` skips the libvips cache of opened files
+            return processor._load_image(source, revalidate=True).copy_memory()
+    elif case["operation"] == "save":
+        def step():
+            return processor._save_image_to_buffer(image, "jpeg")
+    else:
+        name, args, kw = get_operation(case)
+        operation = resolve_operation(VipsProcessor, name)
+
+        def step():
+            return operation(processor, image, *args, **kw).copy_memory()
+
+    baseline_rss = get_peak_rss()
+    walls = []
+    cpus = []
+    for _ in range(repeat):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        result = step()
+        cpus.append(time.process_time() - cpu)
+        walls.append(time.perf_counter() - wall)
+
+    if isinstance(result, bytes):
+        output_size = len(result)
+    else:
+        output_size = result.width * result.height * result.bands
+    return {
+        "wall": statistics.median(walls),
+        "cpu": statistics.median(cpus),
+        "peak_rss": get_peak_rss(),
+        "baseline_rss": baseline_rss,
+        "output_size": output_size,
+    }
+
+
+def get_peak_rss() -> int:
+    """Peak resident set size of this process, in bytes."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports it in kilobytes, macOS in bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run(args: argparse.Namespace) -> int:
+    import pyvips
+
+    sizes = args.sizes or DEFAULT_SIZES
+    libvips_version = ".".join(str(pyvips.version(i)) for i in range(3))
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "libvips": libvips_version,
+            "pyvips": pyvips.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "cases": {},
+    }
+
+    with tempfile.TemporaryDirectory() as folder:
+        fixtures = generate_fixtures(Path(folder), sizes)
+        for case in get_cases(fixtures, sizes, args.filter):
+            command = [
+                sys.executable, __file__, "run-case", json.dumps(case), str(args.repeat)
+            ]
+            output = subprocess.run(
+                command,
+                check=True,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+            ).stdout
+            result = json.loads(output)
+            results["cases"][case["name"]] = result
+            print(
+                f"{case['name']:<48} wall {result['wall'] * 1000:8.1f} ms"
+                f"  cpu {result['cpu'] * 1000:8.1f} ms"
+                f"  peak RSS {result['peak_rss'] / 1024**2:7.1f} MB",
+                flush=True,
+            )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    """Compare two JSON results and report the cases that got slower
+    or used more memory than `threshold` (a ratio).
+    """
+    before = json.loads(Path(args.before).read_text())["cases"]
+    after = json.loads(Path(args.after).read_text())["cases"]
+    regressions = 0
+    for name in sorted(set(before) & set(after)):
+        line = [f"{name:<48}"]
+        for metric in ("wall", "cpu", "peak_rss"):
+            change = get_change(before[name][metric], after[name][metric])
+            if change is None:
+                # e.g. a peak RSS that couldn't be read, or a CPU time of 0
+                line.append(f"{metric} {'n/a':>7}  ")
+                continue
+            flag = " !" if change > args.threshold else "  "
+            regressions += change > args.threshold
+            line.append(f"{metric} {change:+7.1%}{flag}")
+        print("  ".join(line))
+    print(f"\n{regressions} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def get_change(before: float, after: float) -> "Optional[float]":
+    """The relative change from `before` to `after`, or `None` if either
+    is zero, which can't be compared.
+    """
+    if not before or not after:
+        return None
+    return after / before - 1
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", "-o", help="write the results to this JSON file")
+    parser.add_argument("--filter", "-k", default="", help="only run matching cases")
+    parser.add_argument(
+        "--sizes",
+        nargs="*",
+        help=f"WIDTHxHEIGHT of the fixtures (default: {' '.join(DEFAULT_SIZES)})",
+    )
+    parser.add_argument("--repeat", "-r", type=int, default=5)
+    parser.set_defaults(func=run)
+
+    commands = parser.add_subparsers()
+    compare_parser = commands.add_parser("compare", help=compare.__doc__)
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", "-t", type=float, default=0.1)
+    compare_parser.set_defaults(func=compare)
+    return parser
+
+
+def main(argv: "list[str]") -> int:
+    if argv[:1] == ["run-case"]:
+        print(json.dumps(run_case(json.loads(argv[1]), int(argv[2]))))
+        return 0
+    args = get_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1 +1,84 @@
-from .image_processing import *  # noqa
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+from .config import configure  # noqa
+from .config import configure_from_env  # noqa
+from .config import get_config  # noqa
+from .config import get_stats  # noqa
+
+
+if TYPE_CHECKING:
+    from .aio import AsyncRunner  # noqa
+    from .aio import set_default_runner  # noqa
+    from .batch import BatchResult  # noqa
+    from .batch import batch_save  # noqa
+    from .batch import batch_save_async  # noqa
+    from .batch import probe_directory  # noqa
+    from .cache import ResultCache  # noqa
+    from .flight import SingleFlight  # noqa
+    from .formats import get_encoder_options  # noqa
+    from .formats import negotiate_format  # noqa
+    from .image_processing import DEFAULT_FORMAT  # noqa
+    from .image_processing import ImageProcessing  # noqa
+    from .image_processing import OperationNode  # noqa
+    from .image_processing import Plan  # noqa
+    from .lifecycle import init  # noqa
+    from .lifecycle import reinit  # noqa
+    from .lifecycle import shutdown  # noqa
+    from .lifecycle import warm_up  # noqa
+    from .temp import TempStore  # noqa
+    from .temp import get_default_temp_store  # noqa
+    from .temp import set_default_temp_store  # noqa
+    from .tracing import CallbackTracer  # noqa
+    from .tracing import OpenTelemetryTracer  # noqa
+    from .vips_processor import VipsProcessor  # noqa
+
+
+# The public names, and the modules they are imported from when first used,
+# so importing the package doesn't import pyvips or asyncio. The modules
+# import these slow ones with `LazyModule`, only when they're first used.
+LAZY_NAMES = {
+    "AsyncRunner": "aio",
+    "set_default_runner": "aio",
+    "BatchResult": "batch",
+    "batch_save": "batch",
+    "batch_save_async": "batch",
+    "probe_directory": "batch",
+    "ResultCache": "cache",
+    "SingleFlight": "flight",
+    "get_encoder_options": "formats",
+    "negotiate_format": "formats",
+    "DEFAULT_FORMAT": "image_processing",
+    "ImageProcessing": "image_processing",
+    "OperationNode": "image_processing",
+    "Plan": "image_processing",
+    "init": "lifecycle",
+    "reinit": "lifecycle",
+    "shutdown": "lifecycle",
+    "warm_up": "lifecycle",
+    "TempStore": "temp",
+    "get_default_temp_store": "temp",
+    "set_default_temp_store": "temp",
+    "CallbackTracer": "tracing",
+    "OpenTelemetryTracer": "tracing",
+    "VipsProcessor": "vips_processor",
+}
+
+# `from image_processing import *` imports the lazy names too, through `__getattr__`
+__all__ = ["configure", "configure_from_env", "get_config", "get_stats", *LAZY_NAMES]
+
+
+def __getattr__(name: str) -> object:
+    module = LAZY_NAMES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> "list[str]":
+    return sorted(set(globals()) | set(LAZY_NAMES))
+
+
+configure_from_env()
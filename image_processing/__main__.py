@@ -0,0 +1,329 @@
+"""
+Process a batch of pipelines in parallel.
+
+    python -m image_processing specs.json --workers 8 --threads 1
+
+The specs file is a JSON (or YAML) list of pipelines, with the same shape as
+`ImageProcessing.options` and an optional `destination`:
+
+    [
+        {
+            "source": "photos/1.jpg",
+            "destination": "thumbs/1.webp",
+            "operations": [["resize_to_limit", [400, 400], {}]]
+        }
+    ]
+
+It can also be a single pipeline without a source, that is applied to every
+image matched by the glob patterns that follow it, or listed in a file
+(`--sources-from`, `-` for stdin):
+
+    python -m image_processing thumbs.yaml "photos/**/*.jpg" --output-dir thumbs
+    find photos -name "*.jpg" | python -m image_processing thumbs.json --sources-from -
+
+In that case the `destination` of the spec, if any, is a pattern where `{stem}`,
+`{name}`, and `{parent}` are replaced by the parts of the path of each source.
+Otherwise, the results are saved in `--output-dir`, which is then required, with
+the path of the source relative to the folder where its glob pattern starts
+(e.g. `photos/a/1.jpg` is saved as `thumbs/a/1.png`) and the extension of the
+output format. Two sources with the same destination are an error.
+
+With `--skip mtime`, the pipelines whose destination is newer than their source
+are skipped. With `--skip hash`, they are skipped only if neither the content of
+the source nor the pipeline have changed since the last run, as recorded in a
+manifest file.
+"""
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .batch import batch_save
+from .image_processing import ImageProcessing
+
+
+if TYPE_CHECKING:
+    from typing import IO, ContextManager, Iterable, Iterator, Optional, Union
+
+
+SKIP_MODES = ("none", "mtime", "hash")
+MANIFEST_NAME = ".image-processing.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m image_processing",
+        description="Process a batch of image pipelines in parallel.",
+    )
+    parser.add_argument(
+        "specs",
+        help=(
+            "JSON or YAML file with a list of pipeline options, or a single "
+            "pipeline to apply to the sources (`-` for stdin)"
+        ),
+    )
+    parser.add_argument(
+        "sources",
+        nargs="*",
+        default=[],
+        help="glob patterns of the images to process with a single pipeline",
+    )
+    parser.add_argument(
+        "--sources-from",
+        default=None,
+        metavar="FILE",
+        help="file with a list of images to process, one per line (`-` for stdin)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default="",
+        help="folder where to save the results of a single pipeline",
+    )
+    parser.add_argument(
+        "--skip",
+        choices=SKIP_MODES,
+        default="none",
+        help="skip the results that are up to date, by modification time or hash",
+    )
+    parser.add_argument(
+        "--manifest",
+        default="",
+        help=(
+            f"file where the hashes are stored with `--skip hash` "
+            f"(default: {MANIFEST_NAME} in the output folder)"
+        ),
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=None,
+        help="number of libvips threads per worker",
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="only print the errors and the summary",
+    )
+    return parser
+
+
+def open_input(path: str) -> "ContextManager[IO[str]]":
+    """Open a file for reading, or stdin (left open) if `path` is `-`."""
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin)
+    return open(path)
+
+
+def load_specs(path: str) -> "Union[list, dict]":
+    """Read the specs from a JSON or, if PyYAML is installed, YAML file."""
+    if Path(path).suffix.lower() not in (".yaml", ".yml"):
+        with open_input(path) as file:
+            return json.load(file)
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError(
+            "PyYAML is required to read YAML specs: "
+            "pip install image-processing-egg[yaml]"
+        ) from None
+    with open_input(path) as file:
+        return yaml.safe_load(file)
+
+
+def iter_sources(
+    patterns: "Iterable[str]", sources_from: "Optional[IO[str]]" = None
+) -> "Iterator[tuple[str, str]]":
+    """Yield the paths matched by the glob patterns and listed in `sources_from`,
+    without repeating them, with the folder where the pattern starts (empty for
+    the listed ones).
+    """
+    seen = set()
+    for pattern in patterns:
+        root = get_glob_root(pattern)
+        for path in sorted(glob.iglob(pattern, recursive=True)):
+            if path not in seen and os.path.isfile(path):
+                seen.add(path)
+                yield path, root
+    if sources_from is not None:
+        for line in sources_from:
+            path = line.strip()
+            if path and path not in seen:
+                seen.add(path)
+                yield path, ""
+
+
+def get_glob_root(pattern: str) -> str:
+    """The folder of the first part of the pattern with wildcards,
+    e.g. `photos` for `photos/**/*.jpg`.
+    """
+    parts = Path(pattern).parts
+    root = []
+    for part in parts[:-1]:
+        if glob.has_magic(part):
+            break
+        root.append(part)
+    return str(Path(*root)) if root else ""
+
+
+def get_destination(spec: dict, source: str, output_dir: str, root: str = "") -> str:
+    """The destination of the result of applying the single pipeline `spec`
+    to `source`, keeping its path relative to `root` in `output_dir`.
+    """
+    path = Path(source)
+    pattern = spec.get("destination") or ""
+    if pattern:
+        destination = pattern.format(
+            stem=path.stem, name=path.name, parent=str(path.parent)
+        )
+    else:
+        suffix = f".{spec['format']}" if spec.get("format") else path.suffix
+        relative = path.relative_to(root) if root else Path(path.name)
+        destination = str(relative.with_name(path.stem + suffix))
+    return str(Path(output_dir) / destination)
+
+
+def get_hash(spec: dict, source: str) -> str:
+    """A hash of the content of the source and the rest of the pipeline."""
+    options = {key: value for key, value in spec.items() if key != "source"}
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode())
+    with open(source, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_newer(destination: str, source: str) -> bool:
+    try:
+        return os.stat(destination).st_mtime >= os.stat(source).st_mtime
+    except OSError:
+        return False
+
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+
+
+def format_summary(
+    done: int, skipped: int, errors: int, size: int, elapsed: float
+) -> str:
+    elapsed = max(elapsed, 1e-6)
+    return (
+        f"{done} processed, {skipped} skipped, {errors} failed in {elapsed:.2f}s "
+        f"({done / elapsed:.1f} images/s, {size / elapsed / 1024**2:.1f} MB/s read)"
+    )
+
+
+def main(argv: "Optional[list[str]]" = None) -> int:
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    try:
+        specs = load_specs(args.specs)
+    except (OSError, RuntimeError, ValueError) as error:
+        parser.error(str(error))
+
+    if isinstance(specs, dict):
+        if not args.sources and args.sources_from is None:
+            parser.error("a single pipeline needs sources or --sources-from")
+        if not args.output_dir and not specs.get("destination"):
+            parser.error("a single pipeline needs --output-dir or a destination")
+        spec = specs
+        specs = []
+        sources_by_destination: "dict[str, str]" = {}
+        with contextlib.ExitStack() as stack:
+            sources_from = None
+            if args.sources_from is not None:
+                try:
+                    sources_from = stack.enter_context(open_input(args.sources_from))
+                except OSError as error:
+                    parser.error(str(error))
+            for source, root in iter_sources(args.sources, sources_from):
+                destination = get_destination(spec, source, args.output_dir, root)
+                other = sources_by_destination.setdefault(destination, source)
+                if other != source:
+                    parser.error(f"{other} and {source} have the same destination")
+                specs.append({**spec, "source": source, "destination": destination})
+    elif args.sources or args.sources_from is not None:
+        parser.error("sources can only be used with a single pipeline")
+
+    manifest_path = args.manifest or str(Path(args.output_dir) / MANIFEST_NAME)
+    manifest = load_manifest(manifest_path) if args.skip == "hash" else {}
+
+    start = time.perf_counter()
+    submitted: "list[tuple[dict, str]]" = []
+    skipped = 0
+
+    def get_pipelines() -> "Iterator[tuple[ImageProcessing, str]]":
+        nonlocal skipped
+        for spec in specs:
+            source = spec.get("source") or ""
+            destination = spec.get("destination") or ""
+            digest = ""
+            if args.skip != "none" and destination and os.path.isfile(source):
+                if args.skip == "mtime" and is_newer(destination, source):
+                    skipped += 1
+                    continue
+                if args.skip == "hash":
+                    digest = get_hash(spec, source)
+                    if manifest.get(destination) == digest and os.path.exists(
+                        destination
+                    ):
+                        skipped += 1
+                        continue
+            if destination:
+                Path(destination).parent.mkdir(parents=True, exist_ok=True)
+            submitted.append((spec, digest))
+            yield ImageProcessing.from_options(spec), destination
+
+    done = errors = size = 0
+    for result in batch_save(
+        get_pipelines(), workers=args.workers, threads=args.threads
+    ):
+        spec, digest = submitted[result.index]
+        if result.error:
+            errors += 1
+            print(f"{result.source}: {result.error}", file=sys.stderr)
+            continue
+        done += 1
+        if isinstance(spec.get("source"), str) and os.path.isfile(spec["source"]):
+            size += os.stat(spec["source"]).st_size
+        if digest:
+            manifest[spec["destination"]] = digest
+        if not args.quiet:
+            print(f"{result.source} -> {result.destination}")
+
+    if args.skip == "hash":
+        save_manifest(manifest_path, manifest)
+    elapsed = time.perf_counter() - start
+    print(format_summary(done, skipped, errors, size, elapsed), file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
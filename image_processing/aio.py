@@ -0,0 +1,138 @@
+import os
+from functools import partial
+from typing import TYPE_CHECKING
+from weakref import WeakKeyDictionary
+
+from .lazy import LazyModule
+
+
+if TYPE_CHECKING:
+    from asyncio import AbstractEventLoop
+    from concurrent.futures import ThreadPoolExecutor
+    from typing import Any, Callable, Optional
+
+
+asyncio = LazyModule("asyncio")
+futures = LazyModule("concurrent.futures")
+
+
+class AsyncRunner:
+    """
+    Runs the blocking libvips work of pipelines in a bounded pool of threads,
+    so it doesn't block the event loop.
+
+    ```python
+    runner = AsyncRunner(max_workers=4, max_pending=16)
+    result = await pipeline.save_async(runner=runner)
+    ```
+
+    At most `max_workers` pipelines are processed at the same time, and at most
+    `max_pending` are running or waiting for a thread. Any other call waits,
+    without blocking the event loop, until one of those finishes.
+    """
+
+    def __init__(
+        self,
+        max_workers: "Optional[int]" = None,
+        max_pending: "Optional[int]" = None,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max(max_pending or 2 * self.max_workers, self.max_workers)
+        self._executor: "Optional[ThreadPoolExecutor]" = None
+        # `asyncio.Semaphore` can only be used by the loop it was first used with
+        self._semaphores: "WeakKeyDictionary" = WeakKeyDictionary()
+
+    async def run(self, func: "Callable", *args, **kw) -> "Any":
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+
+        async with semaphore:
+            return await loop.run_in_executor(
+                self._get_executor(), partial(func, *args, **kw)
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _get_executor(self) -> "ThreadPoolExecutor":
+        if self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="image_processing",
+            )
+        return self._executor
+
+
+_default_runner: "Optional[AsyncRunner]" = None
+
+
+def get_default_runner() -> AsyncRunner:
+    global _default_runner
+    if _default_runner is None:
+        _default_runner = AsyncRunner()
+    return _default_runner
+
+
+def set_default_runner(runner: "Optional[AsyncRunner]") -> None:
+    """Replace the runner used by `save_async()` when none is given.
+    With `None`, a new one is created when next needed.
+    """
+    global _default_runner
+    _default_runner = runner
+
+
+class AsyncReader:
+    """
+    A blocking, read-only file-like object that reads from an async stream
+    (an async iterable of `bytes` chunks or an object with an async `read()`
+    method) running on `loop`.
+
+    It must be read from a thread other than the one running the loop.
+    """
+
+    def __init__(self, stream: "Any", loop: "AbstractEventLoop"):
+        self._stream = stream
+        self._loop = loop
+        self._chunks = None if is_async_reader(stream) else stream.__aiter__()
+        self._chunk = memoryview(b"")
+        self._offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Returns up to `size` bytes, and `b""` when there's nothing left
+        to read.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._read(size), self._loop)
+        return future.result()
+
+    def seekable(self) -> bool:
+        return False
+
+    async def _read(self, size: int) -> bytes:
+        if self._chunks is None:
+            return await self._stream.read(size)
+
+        while self._offset >= len(self._chunk):
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                return b""
+            self._chunk = memoryview(chunk)
+            self._offset = 0
+
+        end = len(self._chunk) if size < 0 else self._offset + size
+        data = self._chunk[self._offset:end]
+        self._offset += len(data)
+        return bytes(data)
+
+
+def is_async_reader(stream: "Any") -> bool:
+    read = getattr(stream, "read", None)
+    return read is not None and asyncio.iscoroutinefunction(read)
+
+
+def is_async_source(source: "Any") -> bool:
+    return hasattr(source, "__aiter__") or is_async_reader(source)
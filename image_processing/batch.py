@@ -0,0 +1,249 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import NamedTuple
+
+from .aio import get_default_runner
+from .config import configure
+from .config import get_config
+from .image_processing import ImageProcessing
+from .lazy import pyvips
+from .vips_processor import VipsProcessor
+
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+    from typing import AsyncIterator, Iterable, Iterator, Optional, Union
+
+    from .aio import AsyncRunner
+    from .vips_processor import ImageInfo
+
+    TStrOrPath = Union[str, Path]
+    TBatchItem = Union[ImageProcessing, tuple[ImageProcessing, TStrOrPath]]
+    # The index, pipeline, whether it's saved to a temp file, and pool of a task
+    TPending = tuple[int, ImageProcessing, bool, ProcessPoolExecutor]
+
+
+# How many pipelines per worker are submitted to the pool ahead of time.
+# Submitting them lazily keeps the memory flat when processing millions of them.
+PREFETCH = 4
+
+
+class BatchResult(NamedTuple):
+    """The result of one of the pipelines of a batch.
+
+    `index` is the position of the pipeline in the batch. If it failed,
+    `destination` is empty and `error` has a description of the error.
+    """
+
+    index: int
+    source: str
+    destination: str = ""
+    error: str = ""
+
+
+def batch_save(
+    pipelines: "Iterable[TBatchItem]",
+    *,
+    workers: "Optional[int]" = None,
+    threads: "Optional[int]" = None,
+) -> "Iterator[BatchResult]":
+    """
+    Run many pipelines in a pool of processes, and yield their results
+    as they are completed (so not necessarily in order).
+
+    ```python
+    pipeline = ImageProcessing().resize_to_limit(400, 400)
+    pipelines = (pipeline.source(path) for path in paths)
+
+    for result in batch_save(pipelines, workers=8, threads=1):
+        if result.error:
+            print(f"{result.source} failed: {result.error}")
+    ```
+
+    Each item can be a pipeline or a `(pipeline, destination)` tuple.
+    Only the `options` of the pipelines are sent to the workers, so their
+    sources must be paths or in-memory content.
+
+    `workers` defaults to the number of CPUs. `threads` is the number of
+    threads used by libvips in each worker. A value of `1` is a good
+    choice when there are as many workers as CPUs, to avoid oversubscribing them.
+    """
+    workers = workers or os.cpu_count() or 1
+    start_pool = partial(
+        ProcessPoolExecutor,
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(threads, get_config()),
+    )
+    executor = start_pool()
+    items = enumerate(pipelines)
+    pending: "dict[Future, TPending]" = {}
+    prefetch = PREFETCH * workers
+
+    try:
+        while True:
+            for index, item in islice(items, prefetch - len(pending)):
+                pipeline, destination = (
+                    item if isinstance(item, tuple) else (item, "")
+                )
+                options = pipeline.options
+                is_temp = not destination
+                destination = pipeline._get_destination(
+                    destination, pipeline._get_destination_format(destination)
+                )
+                try:
+                    future = executor.submit(save_in_worker, options, destination)
+                except BrokenProcessPool:
+                    executor.shutdown(wait=False)
+                    executor = start_pool()
+                    future = executor.submit(save_in_worker, options, destination)
+                pending[future] = (index, pipeline, is_temp, executor)
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, pipeline, is_temp, pool = pending.pop(future)
+                source = get_label(pipeline.options["source"])
+                try:
+                    destination, error = future.result()
+                except BrokenProcessPool as exc:
+                    # A worker died (e.g. it crashed or was killed), which fails
+                    # all the pipelines of its pool. The rest go to a new one.
+                    destination, error = "", describe_error(exc)
+                    if pool is executor:
+                        executor.shutdown(wait=False)
+                        executor = start_pool()
+                except Exception as exc:
+                    # E.g. options that can't be pickled to send them to a worker
+                    destination, error = "", describe_error(exc)
+                if destination and is_temp:
+                    # Saved by the worker in the temp folder of this process
+                    pipeline._add_temp_result(destination)
+                yield BatchResult(index, source, destination, error)
+    finally:
+        executor.shutdown()
+
+
+async def batch_save_async(
+    pipelines: "Iterable[TBatchItem]",
+    *,
+    runner: "Optional[AsyncRunner]" = None,
+) -> "AsyncIterator[BatchResult]":
+    """
+    Like `batch_save()`, but runs the pipelines using `save_async()` and
+    yields the results asynchronously as they are completed.
+
+    ```python
+    async for result in batch_save_async(pipelines):
+        ...
+    ```
+
+    The concurrency is limited by the `runner` (or the default one), and no
+    more than its `max_pending` pipelines are started at the same time.
+    """
+    runner = runner or get_default_runner()
+    items = enumerate(pipelines)
+    pending: "set[asyncio.Future]" = set()
+
+    while True:
+        for index, item in islice(items, runner.max_pending - len(pending)):
+            pipeline, destination = item if isinstance(item, tuple) else (item, "")
+            coro = save_async(index, pipeline, destination, runner)
+            pending.add(asyncio.ensure_future(coro))
+
+        if not pending:
+            break
+
+        done, pending = await asyncio.wait(
+            pending, return_when=asyncio.FIRST_COMPLETED
+        )
+        for future in done:
+            yield future.result()
+
+
+def probe_directory(
+    folder: "TStrOrPath",
+    pattern: str = "*",
+    *,
+    recursive: bool = False,
+    workers: "Optional[int]" = None,
+) -> "dict[str, ImageInfo]":
+    """
+    Read the metadata of the images of a folder, like `probe()` does, using
+    a pool of `workers` threads, and get a dictionary with their paths as keys.
+
+    ```python
+    for path, info in probe_directory("uploads", "*.jpg").items():
+        print(path, info.width, info.height)
+    ```
+
+    Only the headers are read, so it's mostly I/O bound. The files that
+    libvips can't read are left out.
+    """
+    folder = Path(folder)
+    paths = folder.rglob(pattern) if recursive else folder.glob(pattern)
+    files = sorted(str(path) for path in paths if path.is_file())
+    processor = VipsProcessor()
+
+    def probe(path: str) -> "Optional[ImageInfo]":
+        try:
+            return processor.probe(source=path, loader={})
+        except pyvips.Error:
+            return None
+
+    workers = workers or min(32, 4 * (os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        infos = executor.map(probe, files)
+        return {path: info for path, info in zip(files, infos) if info}
+
+
+async def save_async(
+    index: int,
+    pipeline: ImageProcessing,
+    destination: "TStrOrPath",
+    runner: "AsyncRunner",
+) -> BatchResult:
+    source = get_label(pipeline.options["source"])
+    try:
+        destination = await pipeline.save_async(destination, runner=runner)
+    except Exception as error:
+        return BatchResult(index, source, "", describe_error(error))
+    return BatchResult(index, source, destination)
+
+
+def get_label(source: "object") -> str:
+    return source if isinstance(source, str) else ""
+
+
+def describe_error(error: Exception) -> str:
+    return f"{error.__class__.__name__}: {error}"
+
+
+def init_worker(
+    threads: "Optional[int]" = None, config: "Optional[dict]" = None
+) -> None:
+    # Spawned workers don't inherit what was set with `configure()`
+    if config:
+        configure(**config)
+    if threads:
+        pyvips.concurrency_set(threads)
+
+
+def save_in_worker(options: dict, destination: str) -> "tuple[str, str]":
+    try:
+        return ImageProcessing.from_options(options).save(destination), ""
+    except Exception as error:
+        return "", describe_error(error)
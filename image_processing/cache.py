@@ -0,0 +1,213 @@
+import os
+import tempfile
+import threading
+import time
+from hashlib import md5
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from typing import Any, Iterable, Iterator, Optional, Union
+
+    from .vips_processor import TSource
+
+    TStrOrPath = Union[str, Path]
+
+
+# How many results are added to the cache between scans of its folder, when
+# the estimated size of the cache is still below `max_size`.
+EVICT_INTERVAL = 100
+
+
+class ResultCache:
+    """
+    A persistent cache of processed images.
+
+    ```python
+    cache = ResultCache("/var/cache/thumbnails", max_size=2 * 1024**3)
+    pipeline = ImageProcessing(source_path, cache=cache)
+    pipeline.resize_to_limit(400, 400).save()  # processed
+    pipeline.resize_to_limit(400, 400).save()  # read from the cache
+    ```
+
+    The entries are keyed by the pipeline options and the modification time
+    and size of the source file, so changing the source invalidates them.
+    Use `hash_source=True` to key them by the content of the source instead.
+
+    When `max_size` (in bytes) or `max_age` (in seconds) are defined, the
+    least recently used entries are removed to stay below those limits.
+    The folder is only scanned to do so when the size of the cache, estimated
+    from the results added since the last scan, goes over `max_size`, or every
+    `EVICT_INTERVAL` results (which also accounts for the results added by
+    other processes sharing the folder).
+
+    Results are written to a temporary file and then renamed, so concurrent
+    workers sharing the same folder never read a half-written file.
+    """
+
+    def __init__(
+        self,
+        folder: "TStrOrPath",
+        *,
+        max_size: "Optional[int]" = None,
+        max_age: "Optional[float]" = None,
+        hash_source: bool = False,
+    ):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hash_source = hash_source
+        # Size of the entries, as of the last scan plus the ones added since
+        self._size: "Optional[int]" = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get_filename(
+        self,
+        temp_filename: str,
+        source: "TSource",
+        operations: "Iterable[tuple[str, tuple, dict]]" = (),
+    ) -> str:
+        """Return the filename of the cached result of a pipeline, using its
+        `get_temp_filename()` and a fingerprint of its source and of the files
+        its `operations` read (e.g. the overlay of `composite()`).
+        """
+        name, format = temp_filename.rsplit(".", 1)
+        fingerprints = [self._fingerprint(source)]
+        for _, args, kw in operations:
+            for path in _iter_file_paths((args, kw)):
+                fingerprints.append(f"{path}={self._fingerprint(path)}")
+        key = f"{name}:{':'.join(fingerprints)}".encode("utf8", errors="ignore")
+        return f"{md5(key).hexdigest()}.{format}"
+
+    def get(self, filename: str) -> "Optional[str]":
+        """Return the path of the cached result, or `None` if it isn't cached
+        or it has expired.
+        """
+        path = self.folder / filename
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if self.max_age is not None and now - mtime > self.max_age:
+            self._remove(path)
+            return None
+        # The modification time is used to track the last use
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            # Evicted in the meantime by another worker sharing the folder
+            return None
+        return str(path)
+
+    def get_temp_path(self, filename: str) -> str:
+        """Return a new temporary path, in the cache folder, where the result
+        can be written before adding it to the cache with `set()`.
+        """
+        format = filename.rsplit(".", 1)[-1]
+        fd, temp_path = tempfile.mkstemp(
+            prefix=".", suffix=f".{format}", dir=self.folder
+        )
+        os.close(fd)
+        return temp_path
+
+    def set(self, filename: str, temp_path: "TStrOrPath") -> str:
+        """Atomically move the file at `temp_path` into the cache, and evict
+        old entries if needed. Return the path of the cached result.
+        """
+        path = self.folder / filename
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+        if self._needs_eviction(size):
+            self.evict()
+        return str(path)
+
+    def evict(self) -> None:
+        """Remove the expired entries, and then the least recently used ones
+        until the cache is below `max_size`.
+        """
+        if self.max_size is None and self.max_age is None:
+            return
+
+        now = time.time()
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.folder):
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if self.max_age is not None and now - stat.st_mtime > self.max_age:
+                self._remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        if self.max_size is not None and total_size > self.max_size:
+            for _, size, path in sorted(entries):
+                self._remove(path)
+                total_size -= size
+                if total_size <= self.max_size:
+                    break
+        with self._lock:
+            self._size = total_size
+            self._writes = 0
+
+    def clear(self) -> None:
+        """Remove all the entries in the cache."""
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and not entry.name.startswith("."):
+                self._remove(entry.path)
+
+    # Private
+
+    def _needs_eviction(self, added_size: int) -> bool:
+        if self.max_size is None and self.max_age is None:
+            return False
+        with self._lock:
+            self._writes += 1
+            if self._size is None:
+                return True
+            # Replacing an entry overestimates the size, which only
+            # makes the next scan happen earlier.
+            self._size += added_size
+            over_size = self.max_size is not None and self._size > self.max_size
+            return over_size or self._writes >= EVICT_INTERVAL
+
+    def _fingerprint(self, source: "TSource") -> str:
+        if not isinstance(source, str):
+            # The temp filename of a pipeline already includes
+            # a hash of the source content when it's in memory.
+            return ""
+        if self.hash_source:
+            hash = md5()
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    hash.update(chunk)
+            return hash.hexdigest()
+        stat = os.stat(source)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def _remove(self, path: "TStrOrPath") -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _iter_file_paths(value: "Any") -> "Iterator[str]":
+    """Yield the arguments of an operation that are paths of existing files."""
+    if isinstance(value, (str, Path)):
+        if os.path.isfile(value):
+            yield str(value)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _iter_file_paths(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _iter_file_paths(item)
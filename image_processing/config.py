@@ -0,0 +1,191 @@
+import os
+from typing import TYPE_CHECKING
+
+from .lazy import pyvips
+
+
+if TYPE_CHECKING:
+    from typing import Mapping, Optional, Union
+
+
+# Environment variables read by `configure_from_env()`, and the
+# `configure()` argument each one sets.
+ENV_VARS = {
+    "IMAGE_PROCESSING_THREADS": "threads",
+    "IMAGE_PROCESSING_CACHE_MAX": "cache_max",
+    "IMAGE_PROCESSING_CACHE_MAX_MEM": "cache_max_mem",
+    "IMAGE_PROCESSING_CACHE_MAX_FILES": "cache_max_files",
+    "IMAGE_PROCESSING_ASYNC_WORKERS": "async_workers",
+    "IMAGE_PROCESSING_ASYNC_MAX_PENDING": "async_max_pending",
+    "IMAGE_PROCESSING_TEMP_MAX_SIZE": "temp_max_size",
+    "IMAGE_PROCESSING_TEMP_TMPFS": "temp_tmpfs",
+}
+
+# The `configure()` arguments that are booleans, and the values
+# their environment variables accept.
+BOOLEAN_OPTIONS = {"temp_tmpfs"}
+BOOLEAN_VALUES = {
+    "1": True,
+    "true": True,
+    "yes": True,
+    "on": True,
+    "0": False,
+    "false": False,
+    "no": False,
+    "off": False,
+}
+
+
+def configure(
+    *,
+    threads: "Optional[int]" = None,
+    cache_max: "Optional[int]" = None,
+    cache_max_mem: "Optional[int]" = None,
+    cache_max_files: "Optional[int]" = None,
+    async_workers: "Optional[int]" = None,
+    async_max_pending: "Optional[int]" = None,
+    temp_max_size: "Optional[int]" = None,
+    temp_tmpfs: "Optional[bool]" = None,
+) -> None:
+    """
+    Set the global libvips resource limits. The arguments that aren't
+    defined keep their current value.
+
+    ```python
+    import image_processing
+
+    image_processing.configure(
+        threads=4,
+        cache_max=50,
+        cache_max_mem=50 * 1024**2,
+        cache_max_files=20,
+    )
+    ```
+
+    - `threads`: number of threads libvips uses to process each image.
+    - `cache_max`: max number of operations in the libvips operation cache.
+    - `cache_max_mem`: max memory, in bytes, used by the operation cache.
+    - `cache_max_files`: max number of files kept open by the operation cache.
+    - `async_workers` and `async_max_pending`: limits of the default
+      `AsyncRunner` used by `save_async()`.
+    - `temp_max_size` and `temp_tmpfs`: limits and placement of the default
+      `TempStore`, where results are saved when there's no destination.
+
+    Set `cache_max` to `0` to disable the operation cache. The new default
+    `AsyncRunner` and `TempStore` keep the values of the current ones that
+    aren't defined.
+    """
+    if threads is not None:
+        pyvips.concurrency_set(threads)
+    if cache_max is not None:
+        pyvips.cache_set_max(cache_max)
+    if cache_max_mem is not None:
+        pyvips.cache_set_max_mem(cache_max_mem)
+    if cache_max_files is not None:
+        pyvips.cache_set_max_files(cache_max_files)
+    if async_workers is not None or async_max_pending is not None:
+        from .aio import AsyncRunner, get_default_runner, set_default_runner
+
+        runner = get_default_runner()
+        set_default_runner(
+            AsyncRunner(
+                max_workers=async_workers or runner.max_workers,
+                max_pending=async_max_pending or runner.max_pending,
+            )
+        )
+        # The running calls finish, but the threads aren't kept afterwards
+        runner.shutdown(wait=False)
+    if temp_max_size is not None or temp_tmpfs is not None:
+        from .temp import TMPFS_FOLDER, TempStore
+        from .temp import get_default_temp_store, set_default_temp_store
+
+        store = get_default_temp_store()
+        folder = store.parent
+        if temp_tmpfs is not None and (temp_tmpfs or folder == TMPFS_FOLDER):
+            folder = None
+        set_default_temp_store(
+            TempStore(
+                folder,
+                max_size=store.max_size if temp_max_size is None else temp_max_size,
+                tmpfs=bool(temp_tmpfs),
+                cleanup_at_exit=store.cleanup_at_exit,
+            )
+        )
+
+
+def configure_from_env(environ: "Optional[Mapping[str, str]]" = None) -> dict:
+    """Call `configure()` with the values of the `IMAGE_PROCESSING_*`
+    environment variables that are defined, and return them.
+    """
+    environ = os.environ if environ is None else environ
+    options = {
+        name: parse_env_value(var, environ[var])
+        for var, name in ENV_VARS.items()
+        if environ.get(var, "").strip()
+    }
+    if options:
+        configure(**options)
+    return options
+
+
+def parse_env_value(var: str, value: str) -> "Union[int, bool]":
+    """Parse the value of one of the `ENV_VARS`, raising a `ValueError`
+    that names the variable if it's invalid.
+    """
+    value = value.strip()
+    if ENV_VARS[var] in BOOLEAN_OPTIONS:
+        try:
+            return BOOLEAN_VALUES[value.lower()]
+        except KeyError:
+            expected = ", ".join(BOOLEAN_VALUES)
+            raise ValueError(
+                f"Invalid value for {var}: {value!r} (expected one of {expected})"
+            ) from None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(
+            f"Invalid value for {var}: {value!r} (expected an integer)"
+        ) from None
+
+
+def get_config() -> dict:
+    """
+    Return the current value of every `configure()` argument, e.g. to apply
+    the same configuration in another process with `configure(**config)`.
+    """
+    from .aio import get_default_runner
+    from .temp import TMPFS_FOLDER, get_default_temp_store
+
+    stats = get_stats()
+    runner = get_default_runner()
+    store = get_default_temp_store()
+    return {
+        "threads": stats["threads"],
+        "cache_max": stats["cache_max"],
+        "cache_max_mem": stats["cache_max_mem"],
+        "cache_max_files": stats["cache_max_files"],
+        "async_workers": runner.max_workers,
+        "async_max_pending": runner.max_pending,
+        "temp_max_size": store.max_size,
+        "temp_tmpfs": store.parent == TMPFS_FOLDER,
+    }
+
+
+def get_stats() -> dict:
+    """
+    Return the current libvips limits and usage of the operation cache.
+
+    ```python
+    image_processing.get_stats()
+    # {'threads': 8, 'cache_size': 12, 'cache_max': 100,
+    #  'cache_max_mem': 104857600, 'cache_max_files': 100}
+    ```
+    """
+    return {
+        "threads": pyvips.concurrency_get(),
+        "cache_size": pyvips.cache_get_size(),
+        "cache_max": pyvips.cache_get_max(),
+        "cache_max_mem": pyvips.cache_get_max_mem(),
+        "cache_max_files": pyvips.cache_get_max_files(),
+    }
@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .lazy import LazyModule
+
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+
+if TYPE_CHECKING:
+    from typing import Any, Awaitable, Callable, Optional, Union
+
+
+asyncio = LazyModule("asyncio")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical pipelines, so only one of them is processed
+    and the others wait for its result, instead of all of them decoding and
+    encoding the same image.
+
+    ```python
+    flight = SingleFlight("/var/lock/thumbnails")
+    pipeline = ImageProcessing(source_path, single_flight=flight)
+    pipeline.resize_to_limit(400, 400).save()
+    ```
+
+    Pipelines are identical if they have the same source, options, and output
+    format (the same `get_temp_filename()`). The calls waiting for another one
+    get a copy of its result, saved to their own destination.
+
+    It works across threads, and across coroutines with `save_async()`, which
+    wait without blocking the event loop. With a `lock_folder`, it also works
+    across the processes of the same host that use that folder, using a file
+    lock per pipeline (except on Windows, where it's ignored).
+    """
+
+    def __init__(self, lock_folder: "Union[str, Path, None]" = None):
+        self.lock_folder = Path(lock_folder) if lock_folder and fcntl else None
+        if self.lock_folder:
+            self.lock_folder.mkdir(parents=True, exist_ok=True)
+        self._calls: "dict[str, Future]" = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: str, func: "Callable[[], Any]") -> "tuple[Any, bool]":
+        """
+        Call `func()`, or wait for the result of the call with the same `key`
+        that is already running. Returns the result and whether it came
+        from another call.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()[0], True
+        return self._lead(key, future, lambda: self.run_locked(key, func))
+
+    async def run_async(
+        self, key: str, func: "Callable[[], Awaitable[tuple[Any, bool]]]"
+    ) -> "tuple[Any, bool]":
+        """
+        Like `run()`, but waits without blocking the event loop. `func` must
+        return an awaitable of the result of `run_locked()`, e.g. running it
+        in a thread.
+
+        The work runs in its own task, so if the first call is cancelled
+        the others still get its result.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            result, _ = await asyncio.wrap_future(future)
+            return result, True
+
+        task = asyncio.ensure_future(func())
+        task.add_done_callback(lambda task: self._finish_task(key, future, task))
+        return await asyncio.shield(task)
+
+    def run_locked(self, key: str, func: "Callable[[], Any]") -> "tuple[Any, bool]":
+        """
+        Call `func()` holding the file lock of `key`, or return the result of
+        the process that held it while waiting for it. Returns the result
+        and whether it came from another process.
+        """
+        if self.lock_folder is None:
+            return func(), False
+
+        path = self.lock_folder / f"{key}.lock"
+        started = time.time()
+        with open(path, "a+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)  # type: ignore
+            try:
+                result = self._read_result(file, started)
+                if result is not None:
+                    return result, True
+                result = func()
+                self._write_result(file, result)
+                self._remove_lock_file(path, file)
+                return result, False
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)  # type: ignore
+
+    @property
+    def in_flight(self) -> int:
+        """The number of pipelines being processed."""
+        return len(self._calls)
+
+    # Private
+
+    def _join(self, key: str) -> "tuple[Future, bool]":
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _lead(
+        self, key: str, future: Future, func: "Callable[[], tuple[Any, bool]]"
+    ) -> "tuple[Any, bool]":
+        try:
+            result = func()
+        except BaseException as error:
+            self._finish(key, future, error=error)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def _finish(
+        self,
+        key: str,
+        future: Future,
+        *,
+        result: "Optional[tuple[Any, bool]]" = None,
+        error: "Optional[BaseException]" = None,
+    ) -> None:
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _finish_task(self, key: str, future: Future, task: "Any") -> None:
+        if task.cancelled():
+            self._finish(key, future, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._finish(key, future, error=task.exception())
+        else:
+            self._finish(key, future, result=task.result())
+
+    def _read_result(self, file: "Any", started: float) -> "Optional[str]":
+        # A result saved after this call started was being processed while
+        # it waited for the lock, so it can be shared.
+        file.seek(0)
+        try:
+            record = json.loads(file.read())
+        except ValueError:
+            return None
+        if record["time"] < started or not os.path.exists(record["result"]):
+            return None
+        return record["result"]
+
+    def _write_result(self, file: "Any", result: str) -> None:
+        file.seek(0)
+        file.truncate()
+        file.write(json.dumps({"result": result, "time": time.time()}))
+        file.flush()
+
+    def _remove_lock_file(self, path: Path, file: "Any") -> None:
+        # The processes already waiting for the lock keep reading the removed
+        # file, and later ones create a new one. If another process replaced
+        # it meanwhile, it's left alone.
+        try:
+            if os.stat(path).st_ino == os.fstat(file.fileno()).st_ino:
+                os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,148 @@
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from .lazy import pyvips
+
+
+if TYPE_CHECKING:
+    from typing import Iterable, Union
+
+
+TARGETS = ("smallest", "fastest", "balanced")
+
+# The libvips saver of each format
+SAVERS = {
+    "avif": "heifsave",
+    "webp": "webpsave",
+    "jpeg": "jpegsave",
+    "png": "pngsave",
+}
+
+# The formats, from best to worst, for each target
+PREFERENCES = {
+    "smallest": ("avif", "webp", "jpeg", "png"),
+    "fastest": ("jpeg", "webp", "png", "avif"),
+    "balanced": ("webp", "avif", "jpeg", "png"),
+}
+
+# Formats without transparency
+OPAQUE_FORMATS = ("jpeg",)
+
+# Formats whose size can be reduced by lowering the quality (`Q`)
+LOSSY_FORMATS = ("jpeg", "jpg", "webp", "avif", "heic", "heif", "jxl")
+
+# Formats every client accepts, implied by "image/*" and "*/*"
+COMMON_FORMATS = ("jpeg", "png")
+
+MIME_TYPES = {
+    "image/avif": "avif",
+    "image/webp": "webp",
+    "image/jpeg": "jpeg",
+    "image/jpg": "jpeg",
+    "image/png": "png",
+}
+
+# Saver options of each format for each target
+PRESETS = {
+    "smallest": {
+        "avif": {"effort": 9, "strip": True},
+        "webp": {"effort": 6, "strip": True},
+        "jpeg": {"optimize_coding": True, "interlace": True, "strip": True},
+        "png": {"compression": 9, "palette": True, "effort": 10, "strip": True},
+    },
+    "fastest": {
+        "avif": {"effort": 0, "strip": True},
+        "webp": {"effort": 0, "strip": True},
+        "jpeg": {"optimize_coding": False, "interlace": False, "strip": True},
+        "png": {"compression": 1, "strip": True},
+    },
+    "balanced": {
+        "avif": {"effort": 4, "strip": True},
+        "webp": {"effort": 4, "strip": True},
+        "jpeg": {"optimize_coding": True, "interlace": True, "strip": True},
+        "png": {"compression": 6, "strip": True},
+    },
+}
+
+
+def negotiate_format(
+    accept: "Union[str, Iterable[str]]",
+    target: str = "balanced",
+    *,
+    alpha: bool = False,
+) -> str:
+    """
+    Pick the best output format for `target` ("smallest", "fastest",
+    or "balanced") among the ones accepted by the client.
+
+    ```python
+    negotiate_format("image/avif,image/webp,image/*;q=0.8")  #=> "webp"
+    negotiate_format(["webp", "jpeg"], "fastest")  #=> "jpeg"
+    ```
+
+    `accept` can be the value of an HTTP `Accept` header or a list of formats
+    or MIME types. Formats with `q=0` are excluded, but the order between the
+    accepted ones is decided by `target`. Formats that libvips can't save are
+    skipped, and so is JPEG if the image has an `alpha` channel. When no format
+    matches, it falls back to JPEG (or PNG with `alpha`).
+    """
+    if target not in PREFERENCES:
+        raise ValueError(f"Unknown target `{target}`, use one of {TARGETS}")
+
+    accepted = parse_accept(accept)
+    for format in PREFERENCES[target]:
+        if format not in accepted or not is_supported(format):
+            continue
+        if alpha and format in OPAQUE_FORMATS:
+            continue
+        return format
+    return "png" if alpha else "jpeg"
+
+
+def get_encoder_options(format: str, target: str = "balanced") -> dict:
+    """Return the saver options for `format` that best match `target`."""
+    if target not in PRESETS:
+        raise ValueError(f"Unknown target `{target}`, use one of {TARGETS}")
+    format = "jpeg" if format == "jpg" else format
+    options = dict(PRESETS[target].get(format, {}))
+
+    # `effort` was added in libvips 8.12, before it was `reduction_effort`
+    # for WebP and `speed` (from fastest to slowest) for AVIF.
+    if "effort" in options and not pyvips.at_least_libvips(8, 12):
+        effort = options.pop("effort")
+        if format == "webp":
+            options["reduction_effort"] = effort
+        elif format == "avif":
+            options["speed"] = 9 - effort
+    return options
+
+
+def parse_accept(accept: "Union[str, Iterable[str]]") -> "set[str]":
+    """Return the formats accepted by an `Accept` header or list."""
+    items = accept.split(",") if isinstance(accept, str) else accept
+    formats = set()
+    for item in items:
+        mime_type, *params = [part.strip().lower() for part in item.split(";")]
+        if any(is_refused(param) for param in params):
+            continue
+        if mime_type in ("*/*", "image/*"):
+            formats.update(COMMON_FORMATS)
+            continue
+        format = MIME_TYPES.get(mime_type, mime_type)
+        formats.add("jpeg" if format == "jpg" else format)
+    return formats
+
+
+def is_refused(param: str) -> bool:
+    name, _, value = param.partition("=")
+    try:
+        return name.strip() == "q" and float(value) == 0
+    except ValueError:
+        return False
+
+
+@lru_cache(maxsize=None)
+def is_supported(format: str) -> bool:
+    """Whether this build of libvips can save `format`."""
+    saver = SAVERS.get(format, f"{format}save")
+    return pyvips.type_find("VipsForeignSave", f"{saver}_target") != 0
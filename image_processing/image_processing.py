@@ -1,12 +1,42 @@
-import tempfile
+import os
+import shutil
+import uuid
+from functools import partial
 from hashlib import md5
 from pathlib import Path
 from typing import TYPE_CHECKING
 
+from .aio import AsyncReader
+from .aio import get_default_runner
+from .aio import is_async_source
+from .formats import get_encoder_options
+from .formats import is_supported
+from .formats import negotiate_format
+from .lazy import pyvips
+from .temp import get_default_temp_store
+from .vips_processor import BUFFER_TYPES
 from .vips_processor import VipsProcessor
+from .vips_processor import check_max_bytes_format
+from .vips_processor import resolve_operation
 
 if TYPE_CHECKING:
-    from typing import Callable, Union
+    from typing import (
+        Any,
+        BinaryIO,
+        Callable,
+        Hashable,
+        Iterable,
+        Iterator,
+        Optional,
+        Union,
+    )
+
+    from .aio import AsyncRunner
+    from .cache import ResultCache
+    from .flight import SingleFlight
+    from .tracing import Tracer
+    from .vips_processor import ImageInfo
+    from .vips_processor import TSource
 
     TStrOrPath = Union[str, Path]
 
@@ -15,52 +45,120 @@ DEFAULT_FORMAT = "jpeg"
 
 
 class ImageProcessing:
-    def __init__(self, source: "TStrOrPath" = "", *, temp_folder: "TStrOrPath" = ""):
-        self._processor = VipsProcessor()
-        self._source: str = str(source)
+    def __init__(
+        self,
+        source: "Union[TStrOrPath, TSource]" = "",
+        *,
+        temp_folder: "TStrOrPath" = "",
+        cache: "Optional[ResultCache]" = None,
+        tracer: "Optional[Tracer]" = None,
+        single_flight: "Optional[SingleFlight]" = None,
+    ):
+        self._processor = VipsProcessor(tracer=tracer)
+        self._source: "TSource" = to_source(source)
         self._loader: dict = {}
         self._format: str = ""
         self._saver: dict = {}
-        self._operations: "list[tuple[str, tuple, dict]]" = []
+        self._target: str = ""
+        # The format of in-memory content, detected when first needed
+        self._source_format: "Optional[str]" = None
+        self._operations: "Optional[OperationNode]" = None
         self._temp_folder = Path(temp_folder) if temp_folder else None
+        self._cache = cache
+        self._single_flight = single_flight
 
     @property
     def options(self) -> dict:
         return {
             "source": self._source,
             "format": self._format,
-            "loader": self._loader,
-            "saver": self._saver,
-            "operations": self._operations,
+            "loader": dict(self._loader),
+            "saver": dict(self._saver),
+            "target": self._target,
+            "operations": self._get_operations(),
         }
 
+    @classmethod
+    def from_options(cls, options: dict, **kw) -> "ImageProcessing":
+        """
+        Build a pipeline from its `options`, e.g. after they were serialized
+        to be sent to another process.
+
+        ```python
+        pipeline = ImageProcessing.from_options(json.loads(data))
+        ```
+
+        Any keyword arguments are forwarded to the constructor.
+        """
+        pipeline = cls(options.get("source") or "", **kw)
+        pipeline._format = options.get("format") or ""
+        pipeline._loader = dict(options.get("loader") or {})
+        pipeline._saver = dict(options.get("saver") or {})
+        pipeline._target = options.get("target") or ""
+        for name, args, kw in options.get("operations") or []:
+            pipeline._operations = OperationNode(
+                (name, tuple(args), dict(kw)), pipeline._operations
+            )
+        return pipeline
+
     def __getattr__(self, __name: str) -> "Callable":
         if __name.startswith("_"):
             raise AttributeError(__name)
 
         def operation(*args, **kw) -> "ImageProcessing":
             copy = self._copy()
-            copy._operations.append((__name, args, kw))
+            copy._operations = OperationNode((__name, args, kw), self._operations)
             return copy
 
         return operation
 
-    def source(self, path: "TStrOrPath") -> "ImageProcessing":
-        """ """
+    def source(self, source: "Union[TStrOrPath, TSource]") -> "ImageProcessing":
+        """
+        Specifies the source image. It can be a path, the content of an image file
+        (as `bytes`, `bytearray`, or `memoryview`), a readable file-like object,
+        or an iterable of `bytes` chunks.
+
+        ```python
+        ImageProcessing().source("source.jpg")
+        ImageProcessing().source(request.body)
+        ImageProcessing().source(request.stream)
+        ImageProcessing().source(request.iter_content(64 * 1024))
+        ```
+
+        File-like objects and iterables are read as needed by libvips, so the
+        encoded image never has to be fully in memory.
+        """
         copy = self._copy()
-        copy._source = str(path)
+        copy._source = to_source(source)
+        copy._source_format = None
         return copy
 
     def loader(self, **kw) -> "ImageProcessing":
         """ """
         copy = self._copy()
-        copy._loader.update(kw)
+        copy._loader = {**self._loader, **kw}
         return copy
 
+    def access(self, mode: str) -> "ImageProcessing":
+        """
+        Specifies how libvips will read the source: "random" (the default)
+        or "sequential".
+
+        ```python
+        ImageProcessing(source_path).access("sequential").sharpen().save()
+        ```
+
+        With sequential access libvips reads the image from top to bottom,
+        only keeping in memory the few lines being processed, instead of
+        decoding the whole image first. Operations that need to read the image
+        out of order (e.g. rotations by 90°) fail in this mode.
+        """
+        return self.loader(access=mode)
+
     def saver(self, **kw) -> "ImageProcessing":
         """ """
         copy = self._copy()
-        copy._saver.update(kw)
+        copy._saver = {**self._saver, **kw}
         return copy
 
     def convert(self, format: str) -> "ImageProcessing":
@@ -74,38 +172,327 @@ class ImageProcessing:
         ```
 
         By default the original format is retained when writing the image to a file.
-        If the source file doesn't have a file extension, the format will default to JPEG.
+        In-memory sources keep the format libvips detects in them. If the source file
+        doesn't have a file extension, the format will default to JPEG.
         """
         copy = self._copy()
         copy._format = format
         return copy
 
-    def save(self, destination: "TStrOrPath" = "", save: bool = True) -> str:
+    def negotiate(
+        self,
+        accept: "Union[str, Iterable[str]]",
+        target: str = "balanced",
+        *,
+        alpha: bool = False,
+    ) -> "ImageProcessing":
+        """
+        Choose the output format among the ones accepted by the client, and
+        the saver options, for the `target`: "smallest", "fastest", or "balanced".
+
+        ```python
+        pipeline = ImageProcessing(source_path).negotiate(
+            request.headers["Accept"], "smallest"
+        )
+        data = pipeline.resize_to_limit(400, 400).save_to_buffer()
+        ```
+
+        Set `alpha` if the result has transparency, to skip JPEG. Saver options
+        already defined take precedence over the ones of the target. If the
+        result is saved in another format (e.g. by the extension of the
+        destination), the options of the target for that format are used.
+        """
+        format = negotiate_format(accept, target, alpha=alpha)
+        copy = self.convert(format)
+        copy._saver = {**get_encoder_options(format, target), **self._saver}
+        copy._target = target
+        return copy
+
+    def save(
+        self,
+        destination: "TStrOrPath" = "",
+        save: bool = True,
+        *,
+        max_bytes: "Optional[int]" = None,
+    ) -> str:
         """
         Run the defined processing and get the result. Allows specifying
         the source file and destination.
+
+        If the pipeline has a `ResultCache`, the result is read from it when
+        available. Without a destination, the path inside the cache is returned.
+
+        If it has a `SingleFlight`, and an identical pipeline is already being
+        processed, it waits for it and returns a copy of its result instead.
+
+        With `max_bytes`, the highest quality that produces a file of at most
+        that size is used. The image is processed once, and only encoded
+        again in memory with each quality. It requires a lossy format (e.g.
+        JPEG, WebP or AVIF) and raises a `ValueError` if the image doesn't
+        fit even at the lowest quality. It's the same as `saver(max_bytes=...)`.
         """
-        if not self._source:
-            raise ValueError("You must define a source path using `.source(path)`")
+        if max_bytes:
+            return self.saver(max_bytes=max_bytes).save(destination, save)
+
+        self._check_source()
 
         destination = Path(destination) if destination else ""
         format = self._get_destination_format(destination)
+        if self._saver.get("max_bytes"):
+            check_max_bytes_format(format)
+
+        if self._single_flight and save and not self._is_stream_source():
+            return self._save_single_flight(self._single_flight, destination)
+
+        if self._cache and save and not self._is_stream_source():
+            return self._save_cached(self._cache, destination, format)
+
         final_destination = self._get_destination(destination, format)
+        process = partial(
+            self._processor.save,
+            source=self._source,
+            loader=self._loader,
+            operations=self._get_operations(),
+            saver=self._get_saver(format),
+        )
+        if destination or not save:
+            return process(destination=final_destination, save=save)
+        result = self._replace_temp_result(
+            final_destination, lambda path: process(destination=path)
+        )
+        self._add_temp_result(result)
+        return result
+
+    async def save_async(
+        self,
+        destination: "TStrOrPath" = "",
+        *,
+        runner: "Optional[AsyncRunner]" = None,
+    ) -> str:
+        """
+        Like `save()`, but the processing runs in a bounded pool of threads,
+        without blocking the event loop.
+
+        ```python
+        result = await ImageProcessing(source_path).resize_to_limit(400, 400).save_async()
+        ```
+
+        Besides the sources accepted by `save()`, the source can also be an async
+        iterable of `bytes` chunks or an object with an async `read()` method.
+
+        See `AsyncRunner` for how to limit the concurrency.
+        """
+        runner = runner or get_default_runner()
+        pipeline = self
+        if is_async_source(self._source):
+            import asyncio
+
+            loop = asyncio.get_running_loop()
+            pipeline = self.source(AsyncReader(self._source, loop))
+
+        flight = self._single_flight
+        if flight and not pipeline._is_stream_source():
+            key = self.get_temp_filename(destination)
+            leader = partial(self._without_single_flight().save, destination)
+            result, shared = await flight.run_async(
+                key, lambda: runner.run(flight.run_locked, key, leader)
+            )
+            if not shared:
+                return result
+            return await runner.run(self._save_shared_result, result, destination)
+
+        return await runner.run(pipeline.save, destination)
+
+    def probe(self) -> "ImageInfo":
+        """
+        Read the dimensions, format, number of pages, EXIF orientation, and
+        whether it has an alpha channel, of the source, without decoding it.
+
+        ```python
+        info = ImageProcessing(source_path).probe()
+        info.width, info.height  #=> (600, 800)
+        info.format  #=> "jpeg"
+        ```
+
+        The dimensions are the ones after auto-rotation (unless it's disabled
+        with `.loader(autorot=False)`). Only the header is read, but the
+        stream sources that can't seek back can't be processed afterwards.
+        """
+        self._check_source()
+
+        return self._processor.probe(source=self._source, loader=self._loader)
+
+    def save_to_buffer(self, format: str = "") -> bytes:
+        """
+        Run the defined processing and get the encoded result as `bytes`,
+        without writing it to disk.
+
+        ```python
+        data = ImageProcessing(request.body).resize_to_limit(400, 400).save_to_buffer()
+        ```
+        """
+        self._check_source()
+
+        format = format or self._get_destination_format("")
+        return self._processor.save_to_buffer(
+            source=self._source,
+            loader=self._loader,
+            operations=self._get_operations(),
+            format=format,
+            saver=self._get_saver(format),
+        )
+
+    def save_to_stream(self, stream: "BinaryIO", format: str = "") -> None:
+        """
+        Run the defined processing and write the encoded result, as it's
+        generated, to a writable file-like object.
+
+        ```python
+        with open("result.png", "wb") as f:
+            ImageProcessing(source_path).resize_to_limit(400, 400).save_to_stream(f, "png")
+        ```
+        """
+        self._check_source()
 
-        return self._processor.save(
+        format = format or self._get_destination_format("")
+        self._processor.save_to_stream(
             source=self._source,
             loader=self._loader,
-            operations=self._operations,
-            destination=final_destination,
-            saver=self._saver,
-            save=save,
+            operations=self._get_operations(),
+            stream=stream,
+            format=format,
+            saver=self._get_saver(format),
         )
 
+    def save_pages(
+        self,
+        destination: "TStrOrPath" = "",
+        *,
+        pages: "Optional[Iterable[int]]" = None,
+    ) -> "Iterator[str]":
+        """
+        Run the processing for each page of a multi-page source (e.g. a PDF or
+        a TIFF) separately, and yield the result of each one as it's saved.
+
+        ```python
+        for path in ImageProcessing("document.pdf").resize_to_limit(800, 800) \
+                .convert("png").save_pages("document-{page}.png"):
+            upload(path)
+        ```
+
+        Each page is loaded and processed on its own, so only one of them is
+        in memory at a time. The destination can contain a `{page}` placeholder
+        (the number of the page, starting from 0), otherwise the number is
+        added before the extension. Specific `pages` can be processed instead
+        of all of them. The source must be a path or in-memory content.
+        """
+        self._check_source()
+        if self._is_stream_source():
+            raise TypeError("Only paths and in-memory sources can be saved by page")
+
+        if pages is None:
+            pages = range(self.probe().pages)
+        if destination and "{page}" not in str(destination):
+            path = Path(destination)
+            destination = path.with_name(f"{path.stem}-{{page}}{path.suffix}")
+
+        for page in pages:
+            page_destination = str(destination).format(page=page) if destination else ""
+            yield self.loader(page=page, n=1).save(page_destination)
+
+    def save_many(
+        self,
+        pipelines: "dict[str, ImageProcessing]",
+        destinations: "Optional[dict[str, TStrOrPath]]" = None,
+    ) -> "dict[str, str]":
+        """
+        Run several pipelines branched from this one, decoding the source
+        only once, and get a dictionary with the result of each one.
+
+        ```python
+        pipeline = ImageProcessing(source_path).convert("png")
+
+        results = pipeline.save_many({
+            "large": pipeline.resize_to_limit(800, 800),
+            "medium": pipeline.resize_to_limit(500, 500),
+            "small": pipeline.resize_to_limit(300, 300),
+        })
+        results["small"]  #=> /temp/.../2c5ba8b8f2c2a4c4b1c9e3d6f7a8b9c0.png
+        ```
+
+        The operations shared by all the pipelines are applied only once.
+        You can save the results to specific locations by passing a
+        `destinations` dictionary with the same keys.
+        """
+        self._check_source()
+
+        destinations = destinations or {}
+        branches = []
+        temp_paths = {}
+        for name, pipeline in pipelines.items():
+            if pipeline._source != self._source or pipeline._loader != self._loader:
+                raise ValueError(
+                    f"The `{name}` pipeline must have the same source and loader"
+                )
+            destination = destinations.get(name, "")
+            format = pipeline._get_destination_format(destination)
+            final_destination = pipeline._get_destination(destination, format)
+            if not destination:
+                # Saved next to the temp result, and moved into place below
+                partial_path = self._get_partial_path(final_destination)
+                temp_paths[name] = (partial_path, final_destination)
+                final_destination = partial_path
+            branches.append(
+                (
+                    pipeline._get_operations(),
+                    final_destination,
+                    pipeline._get_saver(format),
+                )
+            )
+
+        try:
+            results = self._processor.save_many(
+                source=self._source,
+                loader=self._loader,
+                branches=branches,
+            )
+        except BaseException:
+            for partial_path, _ in temp_paths.values():
+                _remove_file(partial_path)
+            raise
+        results = dict(zip(pipelines, results))
+        for name, (partial_path, path) in temp_paths.items():
+            if results[name] == partial_path:
+                os.replace(partial_path, path)
+                results[name] = path
+            pipelines[name]._add_temp_result(results[name])
+        return results
+
+    def compile(self) -> "Plan":
+        """
+        Check the operations of the pipeline and get a reusable `Plan`,
+        to process many sources in the same way.
+
+        ```python
+        plan = ImageProcessing().resize_to_limit(400, 400).convert("png").compile()
+
+        for path in paths:
+            plan.save(path)
+        ```
+
+        An unknown operation (e.g. a typo) raises an `AttributeError` here,
+        instead of after the source was read.
+        """
+        return Plan(self)
+
     def get_temp_filename(self, destination: "TStrOrPath" = "") -> str:
         """Return a filename that, for the same source path, options,
         operations (in the same order), etc., will be the same.
         """
-        ops = str(self.options).encode("utf8", errors="ignore")
+        options = self.options
+        if isinstance(self._source, BUFFER_TYPES):
+            options["source"] = md5(self._source).hexdigest()
+        ops = str(options).encode("utf8", errors="ignore")
         hash = md5(ops).hexdigest()
         format = self._get_destination_format(destination)
         return f"{hash}.{format}"
@@ -113,14 +500,111 @@ class ImageProcessing:
     # Private
 
     def _copy(self) -> "ImageProcessing":
-        copy = self.__class__(self._source)
+        # The loader and saver are never modified in place and the operations
+        # are immutable, so the copy can share them.
+        copy = self.__class__.__new__(self.__class__)
         copy._processor = self._processor
-        copy._loader = self._loader.copy()
+        copy._source = self._source
+        copy._source_format = self._source_format
+        copy._loader = self._loader
         copy._format = self._format
-        copy._saver = self._saver.copy()
-        copy._operations = self._operations[:]
+        copy._saver = self._saver
+        copy._target = self._target
+        copy._operations = self._operations
+        copy._temp_folder = self._temp_folder
+        copy._cache = self._cache
+        copy._single_flight = self._single_flight
         return copy
 
+    def _get_operations(self) -> "list[tuple[str, tuple, dict]]":
+        return self._operations.to_list() if self._operations else []
+
+    def _without_single_flight(self) -> "ImageProcessing":
+        copy = self._copy()
+        copy._single_flight = None
+        return copy
+
+    def _save_single_flight(
+        self, flight: "SingleFlight", destination: "TStrOrPath"
+    ) -> str:
+        result, shared = flight.run(
+            self.get_temp_filename(destination),
+            partial(self._without_single_flight().save, destination),
+        )
+        if not shared:
+            return result
+        return self._save_shared_result(result, destination)
+
+    def _save_shared_result(self, result: str, destination: "TStrOrPath") -> str:
+        """Copy the result of an identical pipeline to this one's destination,
+        so each caller can move or remove its result.
+        """
+        format = self._get_destination_format(destination)
+        final_destination = self._get_destination(destination, format)
+        if final_destination == result:
+            # The temp destination of identical pipelines is the same
+            return result
+        try:
+            if destination:
+                shutil.copyfile(result, final_destination)
+            else:
+                self._replace_temp_result(
+                    final_destination, partial(shutil.copyfile, result)
+                )
+        except FileNotFoundError:
+            # Removed in the meantime, e.g. by the temp store of another process
+            return self._without_single_flight().save(destination)
+        if not destination:
+            self._add_temp_result(final_destination)
+        return final_destination
+
+    def _save_cached(
+        self, cache: "ResultCache", destination: "TStrOrPath", format: str
+    ) -> str:
+        filename = cache.get_filename(
+            self.get_temp_filename(destination), self._source, self._get_operations()
+        )
+        cached = cache.get(filename)
+        if not cached:
+            temp_path = cache.get_temp_path(filename)
+            try:
+                self._processor.save(
+                    source=self._source,
+                    loader=self._loader,
+                    operations=self._get_operations(),
+                    destination=temp_path,
+                    saver=self._get_saver(format),
+                )
+            except BaseException:
+                Path(temp_path).unlink()
+                raise
+            cached = cache.set(filename, temp_path)
+
+        if not destination:
+            return cached
+        final_destination = self._get_destination(destination, format)
+        try:
+            shutil.copyfile(cached, final_destination)
+        except FileNotFoundError:
+            # Evicted in the meantime by another worker sharing the folder
+            return self._processor.save(
+                source=self._source,
+                loader=self._loader,
+                operations=self._get_operations(),
+                destination=final_destination,
+                saver=self._get_saver(format),
+            )
+        return final_destination
+
+    def _check_source(self) -> None:
+        if not self._source:
+            raise ValueError("You must define a source path using `.source(path)`")
+        if is_async_source(self._source):
+            raise TypeError("Async sources can only be processed with `save_async()`")
+
+    def _is_stream_source(self) -> bool:
+        return not isinstance(self._source, (str,) + BUFFER_TYPES)
+
     def _get_destination_format(self, destination: "TStrOrPath") -> str:
         format = ""
         if destination:
@@ -129,9 +613,38 @@ class ImageProcessing:
             format
             or self._format
             or self._get_format(self._source)
+            or self._get_buffer_format()
             or DEFAULT_FORMAT
         )
 
+    def _get_buffer_format(self) -> str:
+        # In-memory content keeps its format, as detected by libvips, so
+        # e.g. a PNG doesn't lose its alpha channel by saving it as JPEG
+        if not isinstance(self._source, BUFFER_TYPES):
+            return ""
+        if self._source_format is None:
+            try:
+                format = self._processor.probe(source=self._source, loader={}).format
+            except pyvips.Error:
+                format = ""
+            self._source_format = format if format and is_supported(format) else ""
+        return self._source_format
+
+    def _get_saver(self, format: str) -> dict:
+        """The saver options for `format`. If it isn't the negotiated format,
+        the options of the target for the negotiated one are replaced by
+        the ones for `format`.
+        """
+        if not self._target or format == self._format:
+            return self._saver
+        negotiated = get_encoder_options(self._format, self._target)
+        saver = {
+            name: value
+            for name, value in self._saver.items()
+            if name not in negotiated or negotiated[name] != value
+        }
+        return {**get_encoder_options(format, self._target), **saver}
+
     def _get_destination(self, destination: "TStrOrPath", format: str) -> str:
         if destination:
             destination = Path(destination)
@@ -141,9 +654,162 @@ class ImageProcessing:
 
     def _get_temp_destination(self) -> "Path":
         filename = self.get_temp_filename()
+        if self._temp_folder:
+            return self._temp_folder / filename
+        return get_default_temp_store().get_path(filename)
+
+    def _get_partial_path(self, path: str) -> str:
+        # A unique hidden file in the same folder, with the same extension,
+        # so it can be renamed atomically to `path`
+        folder, name = os.path.split(path)
+        return os.path.join(folder, f".{uuid.uuid4().hex}-{name}")
+
+    def _replace_temp_result(self, path: str, write: "Callable[[str], str]") -> str:
+        """Write the result to a unique file, and move it to its temp path.
+        Identical pipelines share the temp path, so this way they never
+        overwrite a result that was already returned with a partial one.
+        """
+        partial_path = self._get_partial_path(path)
+        try:
+            result = write(partial_path)
+            if result != partial_path:
+                return result
+            os.replace(partial_path, path)
+        except BaseException:
+            _remove_file(partial_path)
+            raise
+        return path
+
+    def _add_temp_result(self, path: str) -> None:
         if not self._temp_folder:
-            self._temp_folder = Path(tempfile.mkdtemp())
-        return self._temp_folder / filename
+            get_default_temp_store().add(path)
 
-    def _get_format(self, file_path: "TStrOrPath") -> str:
+    def _get_format(self, file_path: "Union[TStrOrPath, TSource]") -> str:
+        if not isinstance(file_path, (str, Path)):
+            return ""
         return Path(file_path).suffix.lstrip(".")
+
+
+class OperationNode:
+    """
+    An operation of a pipeline, linked to the previous ones. The nodes are
+    never modified, so pipelines branched from the same one share their
+    common operations instead of copying them.
+    """
+
+    __slots__ = ("operation", "parent")
+
+    def __init__(
+        self,
+        operation: "tuple[str, tuple, dict]",
+        parent: "Optional[OperationNode]" = None,
+    ):
+        self.operation = operation
+        self.parent = parent
+
+    def to_list(self) -> "list[tuple[str, tuple, dict]]":
+        operations = []
+        node: "Optional[OperationNode]" = self
+        while node is not None:
+            operations.append(node.operation)
+            node = node.parent
+        operations.reverse()
+        return operations
+
+
+class Plan:
+    """
+    A compiled pipeline, without a source, that can be applied to many
+    sources. Plans are immutable and hashable, so they can be used as
+    dictionary keys, e.g. to keep a plan per preset.
+    """
+
+    __slots__ = ("_pipeline", "_key")
+
+    def __init__(self, pipeline: "ImageProcessing"):
+        processor_class = type(pipeline._processor)
+        operations = []
+        for name, args, kw in pipeline._get_operations():
+            resolve_operation(processor_class, name)
+            operations.append((name, tuple(args), dict(sorted(kw.items()))))
+
+        self._pipeline = pipeline.source("")
+        self._pipeline._operations = None
+        for operation in operations:
+            self._pipeline._operations = OperationNode(
+                operation, self._pipeline._operations
+            )
+        self._key = _freeze({
+            "format": pipeline._format,
+            "loader": pipeline._loader,
+            "saver": pipeline._saver,
+            "target": pipeline._target,
+            "operations": operations,
+        })
+
+    @property
+    def options(self) -> dict:
+        options = self._pipeline.options
+        del options["source"]
+        return options
+
+    def source(self, source: "Union[TStrOrPath, TSource]") -> ImageProcessing:
+        """Get a pipeline with the operations of this plan for `source`."""
+        return self._pipeline.source(source)
+
+    def save(
+        self, source: "Union[TStrOrPath, TSource]", destination: "TStrOrPath" = ""
+    ) -> str:
+        return self.source(source).save(destination)
+
+    def save_to_buffer(
+        self, source: "Union[TStrOrPath, TSource]", format: str = ""
+    ) -> bytes:
+        return self.source(source).save_to_buffer(format)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Plan):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __repr__(self) -> str:
+        names = ", ".join(name for name, _, _ in self._pipeline._get_operations())
+        return f"<Plan [{names}]>"
+
+
+def _freeze(value: "Any") -> "Hashable":
+    """A hashable version of the options of a pipeline."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(val)) for key, val in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(val) for val in value)
+    if isinstance(value, Path):
+        return str(value)
+    # If pyvips wasn't imported yet, the value can't be an image
+    if pyvips.loaded and isinstance(value, pyvips.Image):
+        # Images can't be compared, so only the same object is equal
+        return (pyvips.Image, id(value))
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def to_source(source: "Union[TStrOrPath, TSource]") -> "TSource":
+    if isinstance(source, (str, Path)):
+        return str(source)
+    # In-memory content, file-like objects, and (async) iterables of chunks
+    if any(hasattr(source, name) for name in ("read", "__iter__", "__aiter__")):
+        return source
+    return str(source)
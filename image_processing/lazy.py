@@ -0,0 +1,44 @@
+import importlib
+import sys
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from types import ModuleType
+    from typing import Any, Optional
+
+
+class LazyModule:
+    """
+    A module that is only imported when one of its attributes is first used.
+
+    ```python
+    pyvips = LazyModule("pyvips")
+    pyvips.Image.new_from_file(path)  # pyvips is imported here
+    ```
+
+    Importing pyvips initializes libvips, which takes a significant part of
+    the startup time of a process, so it's delayed until an image is processed.
+    """
+
+    def __init__(self, name: str):
+        self.__name = name
+        self.__module: "Optional[ModuleType]" = None
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the module was already imported, here or anywhere else."""
+        return self.__module is not None or self.__name in sys.modules
+
+    def __getattr__(self, name: str) -> "Any":
+        # `import_module()` is thread-safe, and returns the same module
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        return getattr(self.__module, name)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__module is not None else "not loaded"
+        return f"<lazy module {self.__name!r} ({state})>"
+
+
+pyvips = LazyModule("pyvips")
@@ -0,0 +1,114 @@
+from typing import TYPE_CHECKING
+
+from .lazy import pyvips
+
+
+if TYPE_CHECKING:
+    from typing import Iterable
+
+
+# Formats preloaded by `warm_up()` when none are given
+DEFAULT_WARM_UP_FORMATS = ("jpeg", "png")
+
+
+def init(formats: "Iterable[str]" = (), **options) -> None:
+    """
+    Prepare this process to process images: set the libvips limits, and
+    warm up the loaders and savers of `formats`.
+
+    ```python
+    # e.g. in the `post_fork` hook of a prefork server
+    image_processing.init(["jpeg", "webp"], threads=2, cache_max=50)
+    ```
+
+    The `options` are forwarded to `configure()`. Calling it is optional, but
+    warming up moves the cost of initializing libvips and the libraries of
+    the formats out of the first request.
+
+    In a prefork server, call it in each worker, after forking: the parent
+    shouldn't process images, so its libvips threads and caches aren't
+    inherited by the workers. It calls `reinit()` to release any that were.
+    Like it, it doesn't call libvips itself: the `options` are applied before
+    the first image is processed, which is the warm-up if there are `formats`.
+    """
+    from .vips_processor import schedule_reinit
+
+    reinit()
+    schedule_reinit(options)
+    if formats:
+        warm_up(formats)
+
+
+def warm_up(formats: "Iterable[str]" = DEFAULT_WARM_UP_FORMATS) -> "list[str]":
+    """
+    Encode and decode a tiny image in each of the formats, so their loaders
+    and savers (and the libraries behind them) are initialized before the
+    first image is processed. Returns the formats that could be warmed up,
+    skipping the ones that this build of libvips doesn't support.
+
+    ```python
+    image_processing.warm_up(["jpeg", "webp", "avif"])  #=> ["jpeg", "webp"]
+    ```
+    """
+    from .vips_processor import run_pending_reinit
+
+    run_pending_reinit()
+    image = pyvips.Image.black(16, 16, bands=3).copy(interpretation="srgb")
+    warmed = []
+    for format in formats:
+        try:
+            data = image.write_to_buffer(f".{format}")
+            pyvips.Image.new_from_buffer(data, "").avg()
+            # The shrink-on-load path used by the resize operations
+            pyvips.Image.thumbnail_buffer(data, 8).avg()
+        except pyvips.Error:
+            continue
+        warmed.append(format)
+    return warmed
+
+
+def shutdown() -> None:
+    """
+    Release the resources held by the package: the threads of the default
+    `AsyncRunner`, the cached overlays and sharpening masks, and the
+    libvips operation cache. The package can still be used afterwards.
+
+    libvips itself is shut down when the process exits.
+    """
+    from .aio import get_default_runner, set_default_runner
+
+    get_default_runner().shutdown()
+    set_default_runner(None)
+    clear_caches()
+
+
+def reinit() -> None:
+    """
+    Release the state inherited from the parent process: the default
+    `AsyncRunner`, whose threads weren't forked, and the cached images and
+    operations, which would only waste memory.
+
+    After `os.fork()`, the child only drops its references to the runner
+    and the overlays, as calling libvips there could deadlock if another
+    thread of the parent was using it. Call this (or `init()`) in the child
+    to release the rest. It doesn't call libvips either: they are released
+    before the next image is processed.
+    """
+    from .aio import set_default_runner
+    from .vips_processor import schedule_reinit
+
+    set_default_runner(None)
+    schedule_reinit()
+
+
+def clear_caches() -> None:
+    if not pyvips.loaded:
+        return
+    from .vips_processor import get_sharpen_mask, overlay_cache
+
+    overlay_cache.clear()
+    get_sharpen_mask.cache_clear()
+    # Lowering the limit of the operation cache trims it
+    cache_max = pyvips.cache_get_max()
+    pyvips.cache_set_max(0)
+    pyvips.cache_set_max(cache_max)
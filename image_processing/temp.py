@@ -0,0 +1,134 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from typing import Optional, Union
+
+
+# Memory-backed filesystem available on most Linux systems
+TMPFS_FOLDER = "/dev/shm"
+
+# Limit, in bytes, of the default store
+DEFAULT_MAX_SIZE = 512 * 1024**2
+
+
+class TempStore:
+    """
+    The folder where pipelines save their results when `save()` is called
+    without a destination. It's shared by all the pipelines of a process.
+
+    ```python
+    image_processing.set_default_temp_store(
+        TempStore(max_size=500 * 1024**2, tmpfs=True)
+    )
+    ```
+
+    - `folder`: where to create the temp folder (by default, the system one).
+    - `max_size`: the oldest results are removed when the total size of the
+      results, in bytes, is over this limit.
+    - `tmpfs`: create the temp folder in `/dev/shm`, if available, so results
+      are kept in memory.
+    - `cleanup_at_exit`: remove the folder, and all the results in it, when
+      the process exits. Results returned by `save()` are then only valid
+      while the process runs.
+
+    The folder is created when first used. Child processes get their own folder.
+    The default store is limited to `DEFAULT_MAX_SIZE` and cleaned up at exit;
+    replace it with `set_default_temp_store()` to change that.
+    """
+
+    def __init__(
+        self,
+        folder: "Union[str, Path, None]" = None,
+        *,
+        max_size: "Optional[int]" = None,
+        tmpfs: bool = False,
+        cleanup_at_exit: bool = False,
+    ):
+        if folder is None and tmpfs and os.access(TMPFS_FOLDER, os.W_OK):
+            folder = TMPFS_FOLDER
+        self.parent = str(folder) if folder else None
+        self.max_size = max_size
+        self.cleanup_at_exit = cleanup_at_exit
+        self._folder: "Optional[Path]" = None
+        self._pid = 0
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if cleanup_at_exit:
+            atexit.register(self.cleanup)
+
+    @property
+    def folder(self) -> Path:
+        with self._lock:
+            if self._folder is None or self._pid != os.getpid():
+                self._folder = Path(
+                    tempfile.mkdtemp(prefix="image_processing-", dir=self.parent)
+                )
+                self._pid = os.getpid()
+                self._sizes.clear()
+                self._size = 0
+            return self._folder
+
+    def get_path(self, filename: str) -> Path:
+        return self.folder / filename
+
+    def add(self, path: "Union[str, Path]") -> None:
+        """Account for a result saved in the folder, removing the oldest
+        ones if the store is over `max_size`.
+        """
+        path = str(path)
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            return
+        with self._lock:
+            self._size += size - self._sizes.pop(path, 0)
+            self._sizes[path] = size
+            if self.max_size is None:
+                return
+            while self._size > self.max_size and len(self._sizes) > 1:
+                oldest, oldest_size = self._sizes.popitem(last=False)
+                self._size -= oldest_size
+                try:
+                    os.remove(oldest)
+                except OSError:
+                    pass
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def cleanup(self) -> None:
+        """Remove the folder and all the results in it."""
+        with self._lock:
+            if self._folder is not None and self._pid == os.getpid():
+                shutil.rmtree(self._folder, ignore_errors=True)
+            self._folder = None
+            self._sizes.clear()
+            self._size = 0
+
+
+_default_temp_store: "Optional[TempStore]" = None
+
+
+def get_default_temp_store() -> TempStore:
+    global _default_temp_store
+    if _default_temp_store is None:
+        _default_temp_store = TempStore(
+            max_size=DEFAULT_MAX_SIZE, cleanup_at_exit=True
+        )
+    return _default_temp_store
+
+
+def set_default_temp_store(store: TempStore) -> None:
+    """Replace the store used by the pipelines without a `temp_folder`."""
+    global _default_temp_store
+    _default_temp_store = store
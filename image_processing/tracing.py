@@ -0,0 +1,97 @@
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from .lazy import pyvips
+
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, ContextManager, Iterator, Optional
+
+    from typing_extensions import Protocol
+
+    class TSpan(Protocol):
+        def set_attribute(self, key: str, value: "Any") -> None:
+            ...
+
+    class Tracer(Protocol):
+        def span(self, name: str) -> "ContextManager[TSpan]":
+            ...
+
+
+class Span:
+    """A stage being measured by a `CallbackTracer`."""
+
+    __slots__ = ("name", "attributes")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.attributes: dict = {}
+
+    def set_attribute(self, key: str, value: "Any") -> None:
+        self.attributes[key] = value
+
+
+class CallbackTracer:
+    """
+    Calls `callback(name, duration, attributes)` at the end of each stage
+    of the processing.
+
+    ```python
+    def log_stage(name, duration, attributes):
+        logger.info("%s took %.1f ms %s", name, duration * 1000, attributes)
+
+    ImageProcessing(source, tracer=CallbackTracer(log_stage))
+    ```
+
+    The stages are "load", then "operation.<name>" for each operation, and
+    "save". Because libvips is lazy, most of the actual work is done (and
+    measured) while saving; the other stages measure setting up the pipeline.
+    """
+
+    def __init__(self, callback: "Callable[[str, float, dict], Any]"):
+        self.callback = callback
+
+    @contextmanager
+    def span(self, name: str) -> "Iterator[Span]":
+        span = Span(name)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.callback(name, time.perf_counter() - start, span.attributes)
+
+
+class OpenTelemetryTracer:
+    """
+    Reports each stage of the processing as an OpenTelemetry span.
+
+    ```python
+    from opentelemetry import trace
+
+    tracer = OpenTelemetryTracer(trace.get_tracer("thumbnails"))
+    ImageProcessing(source, tracer=tracer)
+    ```
+    """
+
+    def __init__(self, tracer: "Any", prefix: str = "image_processing."):
+        self.tracer = tracer
+        self.prefix = prefix
+
+    def span(self, name: str) -> "ContextManager[TSpan]":
+        return self.tracer.start_as_current_span(f"{self.prefix}{name}")
+
+
+def set_image_attributes(span: "TSpan", image: "Any") -> None:
+    if isinstance(image, pyvips.Image):
+        span.set_attribute("width", image.width)
+        span.set_attribute("height", image.height)
+        span.set_attribute("bands", image.bands)
+
+
+def get_mem_highwater() -> "Optional[int]":
+    """Returns the largest amount of memory, in bytes, that libvips has
+    allocated so far, or `None` if pyvips doesn't expose it.
+    """
+    func = getattr(pyvips, "tracked_get_mem_highwater", None)
+    return func() if func else None
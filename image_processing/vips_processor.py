@@ -1,22 +1,107 @@
+import os
 import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import TYPE_CHECKING
+from typing import NamedTuple
+
+from .aio import set_default_runner
+from .formats import LOSSY_FORMATS
+from .lazy import pyvips
+from .tracing import get_mem_highwater
+from .tracing import set_image_attributes
 
-import pyvips
 
 if TYPE_CHECKING:
     from pathlib import Path
-    from typing import Optional, Union
+    from typing import Any, BinaryIO, Callable, Hashable, Iterable, Optional, Union
     from pyvips import Image
 
+    from .tracing import Tracer, TSpan
+
+    TBuffer = Union[bytes, bytearray, memoryview]
+    TSource = Union[str, TBuffer, BinaryIO, Iterable[bytes]]
 
-CENTRE = pyvips.Interesting.CENTRE
+
+CENTRE = "centre"
 MAX_COORD = 10000000
 
-# Default sharpening mask that provides a fast and mild sharpen.
-SHARPEN_MASK = pyvips.Image.new_from_array(
-    [[-1, -1, -1], [-1, 32, -1], [-1, -1, -1]], 24
+# Angles that can be rotated losslessly, without resampling the image
+RIGHT_ANGLES = {90: "d90", 180: "d180", 270: "d270"}
+FLIP_DIRECTIONS = ("horizontal", "vertical")
+
+# The kernels of the sharpening presets that are applied with `conv()`,
+# and with `convsep()` for "separable" (a 1D kernel applied in both directions).
+SHARPEN_KERNELS = {
+    "mild": [[-1, -1, -1], [-1, 32, -1], [-1, -1, -1]],
+    "unsharp": [[0, -1, 0], [-1, 8, -1], [0, -1, 0]],
+    "separable": [[-1, 6, -1]],
+}
+
+# Names accepted by the `sharpen` option of the resize operations
+SHARPEN_PRESETS = ("auto", "none", "sharpen") + tuple(SHARPEN_KERNELS)
+
+# With "auto", images aren't sharpened if they were shrunk less than this
+# (or enlarged), as the resize barely softened them.
+AUTO_SHARPEN_MAX_SCALE = 0.85
+
+# Operations that start with a `thumbnail` and can therefore take advantage
+# of the shrink-on-load feature of some loaders when used first in a pipeline.
+RESIZE_OPERATIONS = (
+    "resize_to_limit",
+    "resize_to_fit",
+    "resize_to_fill",
+    "resize_and_pad",
+)
+
+BUFFER_TYPES = (bytes, bytearray, memoryview)
+
+# Operations that read their input from top to bottom, so the source can be
+# loaded with sequential access if a pipeline only has these.
+SEQUENTIAL_OPERATIONS = frozenset(
+    RESIZE_OPERATIONS
+    + (
+        "composite",
+        "set",
+        "set_type",
+        "set_value",
+        "remove",
+        # pyvips.Image operations
+        "addalpha",
+        "bandjoin_const",
+        "cast",
+        "colourspace",
+        "conv",
+        "convi",
+        "convsep",
+        "copy",
+        "crop",
+        "embed",
+        "extract_area",
+        "extract_band",
+        "flatten",
+        "gamma",
+        "gaussblur",
+        "gravity",
+        "icc_export",
+        "icc_import",
+        "icc_transform",
+        "invert",
+        "linear",
+        "premultiply",
+        "reduce",
+        "resize",
+        "sharpen",
+        "shrink",
+        "thumbnail_image",
+        "unpremultiply",
+    )
 )
 
+# Loader options that can't be combined with a shrink-on-load.
+SHRINK_ON_LOAD_CONFLICTS = ("shrink", "scale")
+
 ANTI_GRAVITY = {
     "north": "south",
     "south": "north",
@@ -31,31 +116,489 @@ def multi_replace(string, substitutions):
     return regex.sub(lambda match: substitutions[match.group(0)], string)
 
 
+class UnloadedImage:
+    """A source that hasn't been loaded yet.
+
+    It's used instead of a `pyvips.Image` as the input of the first resize
+    operation, so the file can be loaded with `pyvips.Image.thumbnail()`.
+    That lets libvips use the shrink-on-load feature of the JPEG, WebP,
+    HEIC, etc. loaders, instead of decoding the full image just to
+    shrink it afterwards.
+    """
+
+    def __init__(self, source: "TSource", *, autorot: bool = True, **options):
+        self.source = source
+        self.autorot = autorot
+        self.options = options
+
+    @property
+    def multi_page(self) -> bool:
+        return self.options.get("n", 1) != 1
+
+    def read_header(self) -> "Optional[Image]":
+        """Returns the source as an image of which only the header is read,
+        or `None` for streams, which can't be read again afterwards.
+        """
+        if isinstance(self.source, str):
+            return pyvips.Image.new_from_file(self.source, **self.options)
+        if isinstance(self.source, BUFFER_TYPES):
+            return pyvips.Image.new_from_buffer(self.source, "", **self.options)
+        return None
+
+    def thumbnail(self, width: int, **options) -> "Image":
+        if pyvips.at_least_libvips(8, 8):  # pragma: no cover
+            options["no_rotate"] = not self.autorot
+        else:  # pragma: no cover
+            options["auto_rotate"] = self.autorot
+
+        option_string = ",".join(
+            f"{name}={to_option_string(value)}"
+            for name, value in self.options.items()
+        )
+        if isinstance(self.source, str):
+            filename = self.source
+            if option_string:
+                filename = f"{filename}[{option_string}]"
+            return pyvips.Image.thumbnail(filename, width, **options)  # type: ignore
+        if isinstance(self.source, BUFFER_TYPES):
+            return pyvips.Image.thumbnail_buffer(  # type: ignore
+                self.source, width, option_string=option_string, **options
+            )
+        source = to_vips_source(self.source)
+        image = pyvips.Image.thumbnail_source(
+            source, width, option_string=option_string, **options
+        )
+        # Unlike `new_from_source()`, `thumbnail_source()` doesn't keep
+        # a reference to the source, but libvips might still read from it.
+        image._references.append(source)  # type: ignore
+        return image  # type: ignore
+
+
+class ImageInfo(NamedTuple):
+    """The metadata of an image, read from its header by `probe()`.
+
+    `width` and `height` are the ones of the image after auto-rotation,
+    i.e. they are swapped for orientations 5 to 8 unless it's disabled.
+    """
+
+    width: int
+    height: int
+    format: str
+    pages: int
+    orientation: int
+    alpha: bool
+
+
+def check_max_bytes_format(format: str) -> None:
+    if format.lower() not in LOSSY_FORMATS:
+        raise ValueError(
+            f"`max_bytes` can only be used with lossy formats, not `{format}`"
+        )
+
+
+def get_format(image: "Image") -> str:
+    """Returns the format the image was loaded from, e.g. "jpeg"."""
+    if not image.get_typeof("vips-loader"):
+        return ""
+    return re.sub(r"load(_buffer|_source|_file)?$", "", image.get("vips-loader"))
+
+
+@lru_cache(maxsize=64)
+def get_sharpen_mask(kernel: "tuple[tuple[int, ...], ...]") -> "Image":
+    """Returns the (cached) mask image of a kernel, normalized so its sum is 1."""
+    scale = sum(sum(row) for row in kernel) or 1
+    return pyvips.Image.new_from_array([list(row) for row in kernel], scale)
+
+
+def __getattr__(name: str) -> "Any":
+    # `SHARPEN_MASK` is created when first used, as creating an image
+    # initializes libvips.
+    if name == "SHARPEN_MASK":
+        return get_sharpen_mask(tuple(map(tuple, SHARPEN_KERNELS["mild"])))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_page_height(image: "Image") -> int:
+    """Returns the height of each page of an image loaded with several
+    pages (e.g. the frames of an animated GIF), which libvips stacks
+    vertically, or the height of the image if it has only one page.
+    """
+    if image.get_typeof("page-height"):
+        page_height = image.get("page-height")
+        if 0 < page_height < image.height and image.height % page_height == 0:
+            return page_height
+    return image.height
+
+
+def map_pages(image: "Image", func: "Callable[[Image], Image]") -> "Image":
+    """Applies `func` to each page of the image, and joins the results."""
+    page_height = get_page_height(image)
+    if page_height == image.height:
+        return func(image)
+
+    pages = [
+        func(image.crop(0, top, image.width, page_height))  # type: ignore
+        for top in range(0, image.height, page_height)
+    ]
+    result = pyvips.Image.arrayjoin(pages, across=1).copy()  # type: ignore
+    result.set_type(pyvips.GValue.gint_type, "page-height", pages[0].height)
+    return result
+
+
+def get_background(
+    image: "Image", background: "Optional[list[float]]" = None
+) -> "list[float]":
+    """Returns a background color with as many bands as the image. By default,
+    it's black and, if the image has an alpha channel, transparent.
+    """
+    if not background:
+        return [0] * image.bands
+    background = list(background)
+    if len(background) < image.bands and image.hasalpha():
+        background.append(255)
+    return background
+
+
+def get_orientation(image: "Image") -> int:
+    """Returns the EXIF orientation of the image, 1 being "upright"."""
+    if image.get_typeof("orientation"):
+        return image.get("orientation")
+    return 1
+
+
+def to_option_string(value: "Union[str, int, float, bool]") -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+class IterableReader:
+    """A minimal read-only file-like object that reads from an iterable
+    of `bytes` chunks (e.g. a chunked upload body), consuming it as needed.
+    """
+
+    def __init__(self, chunks: "Iterable[bytes]"):
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b"")
+        self._offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Returns up to `size` bytes, and `b""` when there's nothing left
+        to read.
+        """
+        while self._offset >= len(self._chunk):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._chunk = memoryview(chunk)
+            self._offset = 0
+
+        end = len(self._chunk) if size < 0 else self._offset + size
+        data = self._chunk[self._offset:end]
+        self._offset += len(data)
+        return bytes(data)
+
+    def seekable(self) -> bool:
+        return False
+
+
+def to_vips_source(stream: "Union[BinaryIO, Iterable[bytes]]") -> "pyvips.Source":
+    """Wraps a readable file-like object, or an iterable of `bytes` chunks,
+    in a `pyvips.Source`, so libvips can read the image from it as needed.
+    """
+    if not hasattr(stream, "read"):
+        stream = IterableReader(stream)  # type: ignore
+    source = pyvips.SourceCustom()
+    source.on_read(stream.read)
+    if is_seekable(stream):
+        source.on_seek(stream.seek)
+    return source
+
+
+def to_vips_target(stream: "BinaryIO") -> "pyvips.Target":
+    """Wraps a writable file-like object in a `pyvips.Target`, so libvips can
+    write the encoded image to it as it's generated.
+    """
+    def write(chunk: bytes) -> int:
+        written = stream.write(chunk)
+        return len(chunk) if written is None else written
+
+    target = pyvips.TargetCustom()
+    target.on_write(write)
+    # Some formats, like TIFF, need to read and seek what they already wrote
+    if is_seekable(stream) and getattr(stream, "readable", lambda: False)():
+        target.on_read(stream.read)
+        target.on_seek(stream.seek)
+    return target
+
+
+def is_seekable(stream: "BinaryIO") -> bool:
+    seekable = getattr(stream, "seekable", None)
+    return bool(seekable and seekable())
+
+
+def common_operations(
+    pipelines: "list[list[tuple[str, tuple, dict]]]",
+) -> "list[tuple[str, tuple, dict]]":
+    """Returns the operations at the start of the list that are the same
+    for all of the pipelines.
+    """
+    shared = []
+    for steps in zip(*pipelines):
+        first = steps[0]
+        if not all(same_operation(first, step) for step in steps[1:]):
+            break
+        shared.append(first)
+    return shared
+
+
+def same_operation(
+    op1: "tuple[str, tuple, dict]", op2: "tuple[str, tuple, dict]"
+) -> bool:
+    # `pyvips.Image` overloads `==` to do a pixel-wise comparison,
+    # so images are compared by identity instead.
+    name1, args1, kw1 = op1
+    name2, args2, kw2 = op2
+    if name1 != name2 or len(args1) != len(args2) or kw1.keys() != kw2.keys():
+        return False
+    values1 = list(args1) + [kw1[key] for key in kw1]
+    values2 = list(args2) + [kw2[key] for key in kw1]
+    return all(same_value(v1, v2) for v1, v2 in zip(values1, values2))
+
+
+def same_value(value1, value2) -> bool:
+    if value1 is value2:
+        return True
+    if isinstance(value1, pyvips.Image) or isinstance(value2, pyvips.Image):
+        return False
+    if isinstance(value1, (list, tuple)) and isinstance(value2, (list, tuple)):
+        return len(value1) == len(value2) and all(
+            same_value(v1, v2) for v1, v2 in zip(value1, value2)
+        )
+    return type(value1) is type(value2) and value1 == value2
+
+
+class OverlayCache:
+    """
+    A bounded, thread-safe, least-recently-used cache of the overlays used
+    by `VipsProcessor.composite()`, so the same watermark isn't read and
+    decoded again for every image.
+    """
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Image]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: "Hashable", load: "Callable[[], Image]") -> "Image":
+        """Returns the cached image for `key`, calling `load()` to get it
+        if it isn't cached yet.
+        """
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                return image
+
+        image = load()
+        with self._lock:
+            self._entries[key] = image
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return image
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+overlay_cache = OverlayCache()
+
+# The caches inherited from the parent process, kept until `reinit()`
+# releases them.
+inherited_state: list = []
+
+
+def reset_after_fork() -> None:
+    """
+    Runs in the child process right after `os.fork()`. Another thread of the
+    parent may have been holding any lock, so it only replaces references:
+    it doesn't take locks or call libvips (not even by releasing an image,
+    which is why the old overlay cache is kept around).
+    """
+    global overlay_cache
+    inherited_state.append(overlay_cache)
+    overlay_cache = OverlayCache()
+    set_default_runner(None)  # its threads weren't forked
+
+
+if hasattr(os, "register_at_fork"):  # not available on Windows
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+
+# What `reinit()` left for the next operation to do, instead of calling
+# libvips itself: the `configure()` options to apply (if any) after
+# releasing the inherited caches, or `None` if there's nothing to do.
+pending_reinit: "Optional[dict]" = None
+
+
+def schedule_reinit(options: "Optional[dict]" = None) -> None:
+    """Release the inherited caches, and then apply the `configure()`
+    `options`, before the next operation. It doesn't call libvips.
+    """
+    global pending_reinit
+    pending_reinit = {**(pending_reinit or {}), **(options or {})}
+
+
+def run_pending_reinit() -> None:
+    """Do what `schedule_reinit()` left for the next operation, if anything."""
+    global pending_reinit
+    options, pending_reinit = pending_reinit, None
+    if options is None:
+        return
+    from .config import configure
+    from .lifecycle import clear_caches
+
+    inherited_state.clear()
+    clear_caches()
+    if options:
+        configure(**options)
+
+
+@lru_cache(maxsize=None)
+def resolve_operation(processor_class: type, name: str) -> "Callable[..., Image]":
+    """
+    Returns a function that applies the operation `name` when called with
+    `(processor, image, *args, **kw)`. Operations of the processor take
+    precedence over the ones of `pyvips.Image`.
+
+    Raises an `AttributeError` if there is no such operation. The result is
+    cached, so the names are only looked up once.
+    """
+    if not name.startswith("_"):
+        method = getattr(processor_class, name, None)
+        if callable(method):
+            return method
+
+        # Also finds the libvips operations that `pyvips.Image` generates
+        image_method = getattr(pyvips.Image, name, None)
+        if callable(image_method):
+            return lambda processor, image, *args, **kw: image_method(
+                image, *args, **kw
+            )
+
+    raise AttributeError(f"Unknown operation: `{name}`")
+
+
 class VipsProcessor:
+    def __init__(self, tracer: "Optional[Tracer]" = None):
+        self.tracer = tracer
+
     def save(
         self,
         *,
-        source: str,
+        source: "TSource",
         loader: dict,
         operations: "list[tuple[str, tuple, dict]]",
         destination: str,
         saver: dict,
         save: bool = True,
     ) -> str:
-        autorot = loader.pop("autorot", loader.pop("autorotate", True))
-        image = self._load_image(source, autorot=autorot, **loader)
-
-        for name, args, kw in operations:
-            op = getattr(self, name, None)
-            if op:
-                image = op(image, *args, **kw)
-            else:
-                image = getattr(image, name)(*args, **kw)
-
+        # The returned image might be used for anything, so it's only
+        # loaded with sequential access when it's going to be saved.
+        image = self._load(source, loader, operations, auto_access=save)
+        image = self._apply(image, operations)
         if not save:
             return image
         return self._save_image(image, destination, **saver)
 
+    def probe(self, *, source: "TSource", loader: dict) -> ImageInfo:
+        """Reads the metadata of the source from its header, without
+        decoding the image.
+        """
+        loader = loader.copy()
+        loader.pop("access", None)
+        autorot = loader.pop("autorot", loader.pop("autorotate", True))
+        run_pending_reinit()
+        image = self._load_image(source, autorot=False, **loader)
+        orientation = get_orientation(image)
+        width, height = image.width, image.height
+        if autorot and orientation in (5, 6, 7, 8):
+            width, height = height, width
+        pages = image.get("n-pages") if image.get_typeof("n-pages") else 1
+        return ImageInfo(
+            width=width,
+            height=height,
+            format=get_format(image),
+            pages=pages,
+            orientation=orientation,
+            alpha=bool(image.hasalpha()),
+        )
+
+    def save_to_buffer(
+        self,
+        *,
+        source: "TSource",
+        loader: dict,
+        operations: "list[tuple[str, tuple, dict]]",
+        format: str,
+        saver: dict,
+    ) -> bytes:
+        """Like `save()` but returns the encoded image instead of writing it
+        to disk.
+        """
+        image = self._load(source, loader, operations)
+        image = self._apply(image, operations)
+        return self._save_image_to_buffer(image, format, **saver)
+
+    def save_to_stream(
+        self,
+        *,
+        source: "TSource",
+        loader: dict,
+        operations: "list[tuple[str, tuple, dict]]",
+        stream: "BinaryIO",
+        format: str,
+        saver: dict,
+    ) -> None:
+        """Like `save()` but writes the encoded image, as it's generated,
+        to a writable file-like object.
+        """
+        image = self._load(source, loader, operations)
+        image = self._apply(image, operations)
+        self._save_image_to_stream(image, stream, format, **saver)
+
+    def save_many(
+        self,
+        *,
+        source: "TSource",
+        loader: dict,
+        branches: "list[tuple[list[tuple[str, tuple, dict]], str, dict]]",
+    ) -> "list[str]":
+        """
+        Process several derivatives of the same source, decoding it only once.
+
+        Each branch is a tuple of `(operations, destination, saver)`. The
+        operations shared by all the branches (if any) are applied only once,
+        and the result is kept in memory and used as the starting point
+        of every branch.
+        """
+        shared = common_operations([operations for operations, _, _ in branches])
+        image = self._load(source, loader, shared)
+        image = self._apply(image, shared)
+        if len(branches) > 1:
+            image = image.copy_memory()  # type: ignore
+
+        return [
+            self._save_image(
+                self._apply(image, operations[len(shared):]), destination, **saver
+            )
+            for operations, destination, saver in branches
+        ]
+
     def resize_to_limit(
         self,
         image: "Image",
@@ -168,7 +711,7 @@ class VipsProcessor:
         height: int,
         *,
         gravity: str = CENTRE,
-        extend: str = pyvips.Extend.BLACK,
+        extend: str = "black",
         background: "Optional[list[float]]" = None,
         alpha: bool = False,
         **options
@@ -220,8 +763,11 @@ class VipsProcessor:
         if alpha and not image.hasalpha():
             image = image.addalpha()  # type: ignore
         background = background or [0, 0, 0]
-        return image.gravity(
-            gravity, width, height, extend=extend, background=background  # type: ignore
+        return map_pages(
+            image,
+            lambda page: page.gravity(  # type: ignore
+                gravity, width, height, extend=extend, background=background
+            ),
         )
 
     def rotate(
@@ -230,6 +776,8 @@ class VipsProcessor:
         degrees: float,
         *,
         background: "Optional[list[float]]" = None,
+        flip: "Optional[str]" = None,
+        interpolate: "Union[str, pyvips.Interpolate, None]" = None,
         **options
     ) -> "Image":
         """Rotates the image by an arbitrary angle.
@@ -238,20 +786,57 @@ class VipsProcessor:
         ImageProcessing(source).rotate(90)
         ```
 
+        Multiples of 90 degrees (including negative ones) are rotated
+        losslessly, without resampling the image. `flip` ("horizontal" or
+        "vertical") mirrors the image after rotating it, also losslessly.
+
+        ```python
+        ImageProcessing(source).rotate(90, flip="horizontal")
+        ```
+
         For degrees that are not a multiple of 90, you can also specify a
         background color for the empty triangles in the corners, left over
-        from rotating the image.
+        from rotating the image, and the interpolator used to resample it
+        (e.g. "nearest", "bilinear", "bicubic", or "nohalo").
 
         ```python
-        ImageProcessing(source).rotate(45, background: [0, 0, 0])
+        ImageProcessing(source).rotate(45, background=[0, 0, 0], interpolate="bicubic")
         ```
 
         Any other options are forwarded to `pyvips.Image.similarity()`.
         See [vips_similarity()](http://libvips.github.io/libvips/API/current/libvips-resample.html#vips-similarity)
         for more details.
         """
-        background = background or [0, 0, 0]
-        return image.similarity(angle=degrees, background=background, **options)  # type: ignore
+        if flip is not None and flip not in FLIP_DIRECTIONS:
+            raise ValueError(f"Unknown flip `{flip}`, use one of {FLIP_DIRECTIONS}")
+
+        if degrees % 90 == 0:
+            angle = RIGHT_ANGLES.get(int(degrees % 360))
+
+            def transform(page: "Image") -> "Image":
+                if angle:
+                    page = page.rot(angle)  # type: ignore
+                if flip:
+                    page = page.flip(flip)  # type: ignore
+                return page
+
+            if not angle and not flip:
+                return image
+            return map_pages(image, transform)
+
+        background = get_background(image, background)
+        if isinstance(interpolate, str):
+            interpolate = pyvips.Interpolate.new(interpolate)
+        if interpolate is not None:
+            options["interpolate"] = interpolate
+
+        def resample(page: "Image") -> "Image":
+            page = page.similarity(  # type: ignore
+                angle=degrees, background=background, **options
+            )
+            return page.flip(flip) if flip else page  # type: ignore
+
+        return map_pages(image, resample)
 
     def composite(
         self,
@@ -302,27 +887,17 @@ class VipsProcessor:
         for more details.
         """
         sources = overlay if isinstance(overlay, list) else [overlay]
-        overlays = [self._to_image_with_alpha(source) for source in sources]
-
-        if gravity:
-            # apply offset with correct gravity and make remainder transparent
-            if offset:
-                overlays_ = []
-                for ov in overlays:
-                    anti_gravity = multi_replace(gravity, ANTI_GRAVITY)
-                    ov = ov.gravity(
-                        anti_gravity, image.width + offset[0], image.height + offset[-1]  # type: ignore
-                    )
-                    overlays_.append(ov)
-                overlays = overlays_
-
-            # create image-sized transparent background and apply specified gravity
-            overlays = [
-                ov.gravity(gravity, image.width, image.height) for ov in overlays  # type: ignore
-            ]
-
-        # apply the composition
-        return image.composite(overlays, blend, **options)  # type: ignore
+        page_height = get_page_height(image)
+        overlays = [
+            self._get_overlay(source, image.width, page_height, gravity, offset)  # type: ignore
+            for source in sources
+        ]
+
+        # apply the composition to each page
+        return map_pages(
+            image,
+            lambda page: page.composite(overlays, blend, **options),  # type: ignore
+        )
 
     def set(self, image: "Image", *args) -> "Image":
         image = image.copy()  # type: ignore
@@ -346,15 +921,108 @@ class VipsProcessor:
 
     # Private
 
-    def _load_image(self, source: str, autorot: bool = True, **options) -> "Image":
+    def _load(
+        self,
+        source: "TSource",
+        loader: dict,
+        operations: "list[tuple[str, tuple, dict]]",
+        *,
+        auto_access: bool = True,
+    ) -> "Union[Image, UnloadedImage]":
+        run_pending_reinit()
+        if self.tracer is None:
+            return self._load_source(source, loader, operations, auto_access)
+
+        with self.tracer.span("load") as span:
+            image = self._load_source(source, loader, operations, auto_access)
+            shrink_on_load = isinstance(image, UnloadedImage)
+            span.set_attribute("shrink_on_load", shrink_on_load)
+            # The dimensions of the source, from its header
+            set_image_attributes(span, image.read_header() if shrink_on_load else image)
+            return image
+
+    def _load_source(
+        self,
+        source: "TSource",
+        loader: dict,
+        operations: "list[tuple[str, tuple, dict]]",
+        auto_access: bool,
+    ) -> "Union[Image, UnloadedImage]":
+        loader = loader.copy()
+        autorot = loader.pop("autorot", loader.pop("autorotate", True))
+        if self._can_shrink_on_load(loader, operations):
+            return UnloadedImage(source, autorot=autorot, **loader)
+
+        if auto_access and self._can_load_sequentially(source, loader, operations):
+            image = self._load_image(
+                source, autorot=False, access="sequential", **loader
+            )
+            # Rotating or flipping the image can't be done sequentially,
+            # so in that case it's loaded again with random access.
+            if not autorot or get_orientation(image) == 1:
+                return image.autorot() if autorot else image  # type: ignore
+
+        return self._load_image(source, autorot=autorot, **loader)
+
+    def _can_load_sequentially(
+        self,
+        source: "TSource",
+        loader: dict,
+        operations: "list[tuple[str, tuple, dict]]",
+    ) -> bool:
+        """Returns `True` if the access mode wasn't specified, the source can be
+        loaded again if needed, and every operation of the pipeline reads
+        the image from top to bottom.
         """
-        Loads the image on disk into a pyvips.Image object. Accepts additional
+        if "access" in loader or not isinstance(source, (str,) + BUFFER_TYPES):
+            return False
+        return all(name in SEQUENTIAL_OPERATIONS for name, _, _ in operations)
+
+    def _apply(
+        self,
+        image: "Union[Image, UnloadedImage]",
+        operations: "list[tuple[str, tuple, dict]]",
+    ) -> "Image":
+        tracer = self.tracer
+        for name, args, kw in operations:
+            if tracer is None:
+                image = self._apply_operation(image, name, args, kw)
+                continue
+            with tracer.span(f"operation.{name}") as span:
+                image = self._apply_operation(image, name, args, kw)
+                set_image_attributes(span, image)
+        return image  # type: ignore
+
+    def _apply_operation(
+        self,
+        image: "Union[Image, UnloadedImage]",
+        name: str,
+        args: tuple,
+        kw: dict,
+    ) -> "Image":
+        return resolve_operation(type(self), name)(self, image, *args, **kw)
+
+    def _load_image(
+        self, source: "TSource", autorot: bool = True, **options
+    ) -> "Image":
+        """
+        Loads the image on disk, in memory, or from a readable file-like object
+        or iterable of chunks into a pyvips.Image object. Accepts additional
         loader-specific options (e.g. interlacing). Afterwards auto-rotates the
         image to be upright (according to the EXIF data).
         """
-        image = pyvips.Image.new_from_file(source, **options)
+        if isinstance(source, str):
+            image = pyvips.Image.new_from_file(source, **options)
+        elif isinstance(source, BUFFER_TYPES):
+            # `new_from_buffer()` doesn't accept a `memoryview` but a cffi buffer
+            # is accepted without converting it to `bytes` first (libvips still
+            # makes its own copy of the data).
+            data = pyvips.ffi.from_buffer(source)
+            image = pyvips.Image.new_from_buffer(data, "", **options)
+        else:
+            image = pyvips.Image.new_from_source(to_vips_source(source), "", **options)
         if autorot:
-            image = image.autorot()  # type: ignore
+            image = map_pages(image, lambda page: page.autorot())  # type: ignore
         return image  # type: ignore
 
     def _save_image(
@@ -363,39 +1031,268 @@ class VipsProcessor:
         destination: str,
         *,
         quality: "Optional[int]" = None,
+        max_bytes: "Optional[int]" = None,
         **options
     ) -> str:
         """
         Writes the `pyvips.Image` object to disk. This starts the processing
         pipeline defined in the Image object. Accepts additional
         saver-specific options (e.g. quality).
+
+        With `max_bytes`, the image is encoded in memory until it fits,
+        and only the final result is written.
         """
+        if max_bytes:
+            format = os.path.splitext(destination)[1].lstrip(".")
+            data = self._save_image_to_buffer(
+                image, format, quality=quality, max_bytes=max_bytes, **options
+            )
+            with open(destination, "wb") as file:
+                file.write(data)
+            return destination
+
         if quality:
             options["Q"] = quality
-        image.write_to_file(destination, **options)
+        if self.tracer is None:
+            image.write_to_file(destination, **options)
+            return destination
+
+        with self.tracer.span("save") as span:
+            image.write_to_file(destination, **options)
+            self._set_save_attributes(span, image, os.path.getsize(destination))
         return destination
 
-    def _thumbnail(
+    def _save_image_to_buffer(
+        self,
+        image: "Image",
+        format: str,
+        *,
+        quality: "Optional[int]" = None,
+        max_bytes: "Optional[int]" = None,
+        **options
+    ) -> bytes:
+        """
+        Encodes the `pyvips.Image` object in memory. This starts the processing
+        pipeline defined in the Image object. Accepts additional
+        saver-specific options (e.g. quality).
+        """
+        if quality:
+            options["Q"] = quality
+        if self.tracer is None:
+            return self._write_to_buffer(image, format, max_bytes, options)
+
+        with self.tracer.span("save") as span:
+            data = self._write_to_buffer(image, format, max_bytes, options)
+            self._set_save_attributes(span, image, len(data))
+        return data
+
+    def _save_image_to_stream(
         self,
         image: "Image",
+        stream: "BinaryIO",
+        format: str,
+        *,
+        quality: "Optional[int]" = None,
+        max_bytes: "Optional[int]" = None,
+        **options
+    ) -> None:
+        """
+        Writes the `pyvips.Image` object to a file-like object. This starts
+        the processing pipeline defined in the Image object. Accepts additional
+        saver-specific options (e.g. quality).
+        """
+        if max_bytes:
+            stream.write(
+                self._save_image_to_buffer(
+                    image, format, quality=quality, max_bytes=max_bytes, **options
+                )
+            )
+            return
+
+        if quality:
+            options["Q"] = quality
+        target = to_vips_target(stream)
+        if self.tracer is None:
+            image.write_to_target(target, f".{format}", **options)  # type: ignore
+            return
+
+        with self.tracer.span("save") as span:
+            image.write_to_target(target, f".{format}", **options)  # type: ignore
+            self._set_save_attributes(span, image, None)
+
+    def _write_to_buffer(
+        self,
+        image: "Image",
+        format: str,
+        max_bytes: "Optional[int]",
+        options: dict,
+    ) -> bytes:
+        if not max_bytes:
+            return image.write_to_buffer(f".{format}", **options)  # type: ignore
+
+        check_max_bytes_format(format)
+        # Process the image only once, to encode it several times
+        image = image.copy_memory()
+        options = options.copy()
+        low, high = 1, options.pop("Q", 100)
+
+        def encode(quality: int) -> bytes:
+            return image.write_to_buffer(  # type: ignore
+                f".{format}", Q=quality, **options
+            )
+
+        # The highest quality is tried first, as it's often small enough
+        data = encode(high)
+        if len(data) <= max_bytes:
+            return data
+
+        result = None
+        high -= 1
+        while low <= high:
+            quality = (low + high) // 2
+            data = encode(quality)
+            if len(data) <= max_bytes:
+                result = data
+                low = quality + 1
+            else:
+                high = quality - 1
+
+        if result is None:
+            raise ValueError(f"The image can't be encoded in {max_bytes} bytes")
+        return result
+
+    def _set_save_attributes(
+        self, span: "TSpan", image: "Image", bytes_written: "Optional[int]"
+    ) -> None:
+        set_image_attributes(span, image)
+        if bytes_written is not None:
+            span.set_attribute("bytes_written", bytes_written)
+        mem_highwater = get_mem_highwater()
+        if mem_highwater is not None:
+            span.set_attribute("mem_highwater", mem_highwater)
+
+    def _can_shrink_on_load(
+        self, loader: dict, operations: "list[tuple[str, tuple, dict]]"
+    ) -> bool:
+        """Returns `True` if the pipeline starts with a resize, and the loader
+        options can be passed to `pyvips.Image.thumbnail()` as an option string.
+        """
+        if not operations or operations[0][0] not in RESIZE_OPERATIONS:
+            return False
+        for name, value in loader.items():
+            if name in SHRINK_ON_LOAD_CONFLICTS:
+                return False
+            if not isinstance(value, (str, int, float, bool)):
+                return False
+        return True
+
+    def _thumbnail(
+        self,
+        image: "Union[Image, UnloadedImage]",
         width: int,
         height: int,
-        sharpen: "Optional[Image]" = SHARPEN_MASK,  # type: ignore
+        sharpen: "Union[str, Image, list[list[float]], None]" = "auto",
         **options
     ) -> "Image":
         """Resizes the image according to the specified parameters,
         and sharpens the resulting thumbnail.
+
+        `sharpen` is the name of a preset, a mask image or a 2D array, or
+        `None`/`False` to not sharpen it. The presets are:
+
+        - "mild": a fast convolution with a 3x3 mask (`SHARPEN_MASK`).
+        - "unsharp": a stronger 3x3 mask.
+        - "separable": a 1D mask applied horizontally and vertically,
+          cheaper than a 3x3 one.
+        - "sharpen": the libvips `sharpen` operation, slower but of
+          better quality.
+        - "none": no sharpening.
+        - "auto" (the default): "mild", unless the image was barely
+          shrunk or was enlarged, in which case it isn't sharpened.
         """
-        # We're already autorotating when loading the image
-        if pyvips.at_least_libvips(8, 8):  # pragma: no cover
-            options["no_rotate"] = True
-        else:  # pragma: no cover
-            options["auto_rotate"] = False
+        # `==` can't be used with images, as it's a libvips operation
+        preset = sharpen if isinstance(sharpen, str) else None
+        if preset and preset not in SHARPEN_PRESETS:
+            raise ValueError(
+                f"Unknown sharpen preset `{preset}`, use one of {SHARPEN_PRESETS}"
+            )
+        input_size = self._get_input_size(image) if preset == "auto" else None
+
+        multi_page = isinstance(image, UnloadedImage) and image.multi_page
+        if multi_page and options.get("crop"):
+            # `thumbnail()` would crop all the pages together
+            image = self._load_image(
+                image.source, autorot=image.autorot, **image.options
+            )
+
+        if isinstance(image, UnloadedImage):
+            image = image.thumbnail(width, height=height, **options)
+        else:
+            # We're already autorotating when loading the image
+            if pyvips.at_least_libvips(8, 8):  # pragma: no cover
+                options["no_rotate"] = True
+            else:  # pragma: no cover
+                options["auto_rotate"] = False
+            image = map_pages(
+                image,
+                lambda page: page.thumbnail_image(  # type: ignore
+                    width, height=height, **options
+                ),
+            )
+
+        if preset == "auto":
+            sharpen = "mild"
+            if input_size:
+                scale = max(
+                    image.width / input_size[0],
+                    get_page_height(image) / input_size[1],  # type: ignore
+                )
+                if scale > AUTO_SHARPEN_MAX_SCALE:
+                    sharpen = "none"
+        return self._sharpen(image, sharpen)  # type: ignore
+
+    def _sharpen(
+        self, image: "Image", sharpen: "Union[str, Image, list[list[float]], None]"
+    ) -> "Image":
+        preset = sharpen if isinstance(sharpen, str) else None
+        if isinstance(sharpen, pyvips.Image):
+            mask = sharpen
+        elif not sharpen or preset == "none":
+            return image
+        elif preset == "sharpen":
+            return map_pages(image, lambda page: page.sharpen())  # type: ignore
+        else:
+            kernel = SHARPEN_KERNELS[preset] if preset else sharpen
+            mask = get_sharpen_mask(tuple(map(tuple, kernel)))  # type: ignore
+
+        convolution = "convsep" if preset == "separable" else "conv"
+        return map_pages(
+            image,
+            lambda page: getattr(page, convolution)(
+                mask, precision=pyvips.Precision.INTEGER
+            ),
+        )
 
-        image = image.thumbnail_image(width, height=height, **options)  # type: ignore
-        if sharpen:
-            image = image.conv(sharpen, precision=pyvips.Precision.INTEGER)  # type: ignore
-        return image
+    def _get_input_size(
+        self, image: "Union[Image, UnloadedImage]"
+    ) -> "Optional[tuple[int, int]]":
+        """Returns the dimensions of the image (of each page) before resizing,
+        or `None` if they can't be known without reading a stream source.
+        """
+        if not isinstance(image, UnloadedImage):
+            return image.width, get_page_height(image)
+        if not isinstance(image.source, (str,) + BUFFER_TYPES):
+            return None
+        # Only the header is read
+        if isinstance(image.source, str):
+            header = pyvips.Image.new_from_file(image.source, **image.options)
+        else:
+            data = pyvips.ffi.from_buffer(image.source)
+            header = pyvips.Image.new_from_buffer(data, "", **image.options)
+        width, height = header.width, get_page_height(header)  # type: ignore
+        if image.autorot and get_orientation(header) in (5, 6, 7, 8):  # type: ignore
+            width, height = height, width
+        return width, height
 
     def _default_dimensions(
         self, width: "Optional[int]", height: "Optional[int]"
@@ -404,10 +1301,64 @@ class VipsProcessor:
             raise ValueError("either width or height must be specified")
         return width or MAX_COORD, height or MAX_COORD
 
+    def _get_overlay(
+        self,
+        source: "Union[str, Path, Image]",
+        width: int,
+        height: int,
+        gravity: "Optional[str]",
+        offset: "Optional[list[float]]",
+    ) -> "Image":
+        """Returns the overlay, with an alpha channel and positioned in
+        a canvas of the specified size.
+
+        Overlays loaded from files are cached, and invalidated if the file changes.
+        """
+        if isinstance(source, pyvips.Image):
+            return self._position_overlay(
+                self._to_image_with_alpha(source), width, height, gravity, offset
+            )
+
+        path = str(source)
+        stat = os.stat(path)
+        file_key = (path, stat.st_mtime_ns, stat.st_size)
+        key = file_key + (width, height, gravity, tuple(offset or ()))
+
+        def prepare() -> "Image":
+            return self._to_image_with_alpha(path).copy_memory()  # type: ignore
+
+        def position() -> "Image":
+            ov = overlay_cache.get(file_key, prepare)
+            return self._position_overlay(ov, width, height, gravity, offset)
+
+        return overlay_cache.get(key, position)
+
+    def _position_overlay(
+        self,
+        ov: "Image",
+        width: int,
+        height: int,
+        gravity: "Optional[str]",
+        offset: "Optional[list[float]]",
+    ) -> "Image":
+        if not gravity:
+            return ov
+
+        # apply offset with correct gravity and make remainder transparent
+        if offset:
+            anti_gravity = multi_replace(gravity, ANTI_GRAVITY)
+            ov = ov.gravity(anti_gravity, width + offset[0], height + offset[-1])  # type: ignore
+
+        # create image-sized transparent background and apply specified gravity
+        return ov.gravity(gravity, width, height)  # type: ignore
+
     def _to_image_with_alpha(self, source: "Union[str, Path, Image]") -> "Image":
         if isinstance(source, pyvips.Image):
             image = source
-        else:
+        elif pyvips.at_least_libvips(8, 11):  # pragma: no cover
+            # Don't get a stale image from the libvips cache if the file changed
+            image = pyvips.Image.new_from_file(source, revalidate=True)
+        else:  # pragma: no cover
             image = pyvips.Image.new_from_file(source)
         if not image.hasalpha():  # type: ignore
             image = image.addalpha()  # type: ignore
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from image_processing import AsyncRunner
+from image_processing import ImageProcessing
+from image_processing import batch_save_async
+
+from .utils import assert_dimensions
+from .utils import fixture_image
+
+
+portrait = fixture_image("portrait.jpg")
+
+
+def test_save_async():
+    async def main():
+        return await ImageProcessing(portrait).resize_to_limit(400, 400).save_async()
+
+    assert_dimensions([300, 400], asyncio.run(main()))
+
+
+def test_save_async_doesnt_block_the_loop():
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def save(*args):
+        threads.append(threading.get_ident())
+        return "result.jpg"
+
+    async def main():
+        pipeline = ImageProcessing(portrait)
+        pipeline.save = save
+        return await pipeline.save_async()
+
+    assert asyncio.run(main()) == "result.jpg"
+    assert threads and threads[0] != loop_thread
+
+
+def test_runner_limits_concurrency():
+    running = []
+    max_running = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running.append(1)
+            max_running.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.pop()
+
+    async def main():
+        runner = AsyncRunner(max_workers=2, max_pending=3)
+        await asyncio.gather(*[runner.run(work) for _ in range(8)])
+        runner.shutdown()
+
+    asyncio.run(main())
+    assert max(max_running) == 2
+
+
+def test_accepts_async_iterable_source():
+    data = Path(portrait).read_bytes()
+
+    async def chunks():
+        for start in range(0, len(data), 4096):
+            await asyncio.sleep(0)
+            yield data[start:start + 4096]
+
+    async def main():
+        return await ImageProcessing(chunks()).resize_to_limit(400, 400).save_async()
+
+    assert_dimensions([300, 400], asyncio.run(main()))
+
+
+def test_accepts_async_reader_source():
+    data = Path(portrait).read_bytes()
+
+    class Reader:
+        offset = 0
+
+        async def read(self, size=-1):
+            chunk = data[self.offset:self.offset + size]
+            self.offset += len(chunk)
+            return chunk
+
+    async def main():
+        return await ImageProcessing(Reader()).rotate(90).save_async()
+
+    assert_dimensions([800, 600], asyncio.run(main()))
+
+
+def test_async_sources_require_save_async():
+    async def chunks():
+        yield b""
+
+    with pytest.raises(TypeError):
+        ImageProcessing(chunks()).save()
+
+
+def test_batch_save_async(tmp_path):
+    pipeline = ImageProcessing().resize_to_limit(400, 400)
+    pipelines = [
+        pipeline.source(portrait),
+        (pipeline.source(fixture_image("landscape.jpg")), tmp_path / "landscape.png"),
+        pipeline.source(str(tmp_path / "missing.jpg")),
+    ]
+
+    async def main():
+        runner = AsyncRunner(max_workers=2)
+        return [result async for result in batch_save_async(pipelines, runner=runner)]
+
+    results = sorted(asyncio.run(main()))
+    assert [result.index for result in results] == [0, 1, 2]
+    assert_dimensions([300, 400], results[0].destination)
+    assert results[1].destination == str(tmp_path / "landscape.png")
+    assert results[2].error
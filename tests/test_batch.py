@@ -0,0 +1,227 @@
+import io
+import json
+import os
+import shutil
+
+import pytest
+import pyvips
+
+from image_processing import ImageProcessing
+from image_processing import TempStore
+from image_processing import configure
+from image_processing import get_config
+from image_processing import temp
+from image_processing.__main__ import main
+from image_processing import batch
+from image_processing.batch import batch_save
+
+from .utils import assert_dimensions
+from .utils import assert_format
+from .utils import fixture_image
+
+
+portrait = fixture_image("portrait.jpg")
+landscape = fixture_image("landscape.jpg")
+
+
+def test_batch_save(tmp_path):
+    pipeline = ImageProcessing().resize_to_limit(400, 400)
+    pipelines = [
+        pipeline.source(portrait),
+        (pipeline.source(landscape), tmp_path / "landscape.png"),
+        pipeline.source(fixture_image("invalid.jpg")).loader(fail=True),
+    ]
+    results = sorted(batch_save(pipelines, workers=2, threads=1))
+    assert [result.index for result in results] == [0, 1, 2]
+
+    assert results[0].source == portrait
+    assert results[0].error == ""
+    assert_dimensions([300, 400], results[0].destination)
+
+    assert results[1].destination == str(tmp_path / "landscape.png")
+    assert_dimensions([400, 300], results[1].destination)
+
+    assert results[2].destination == ""
+    assert results[2].error.startswith("Error: ")
+
+
+def test_batch_save_from_options(tmp_path):
+    pipeline = ImageProcessing(portrait).convert("png").resize_to_fill(100, 100)
+    options = json.loads(json.dumps(pipeline.options))
+    rebuilt = ImageProcessing.from_options(options)
+    assert rebuilt.options == pipeline.options
+
+
+def test_cli(tmp_path, capsys):
+    specs = tmp_path / "specs.json"
+    specs.write_text(json.dumps([
+        {
+            "source": portrait,
+            "destination": str(tmp_path / "portrait.png"),
+            "operations": [["resize_to_limit", [400, 400], {}]],
+        },
+        {"source": str(tmp_path / "missing.jpg")},
+    ]))
+
+    assert main([str(specs), "--workers", "2"]) == 1
+    captured = capsys.readouterr()
+    assert f"{portrait} -> {tmp_path / 'portrait.png'}" in captured.out
+    assert "missing.jpg" in captured.err
+    assert_dimensions([300, 400], str(tmp_path / "portrait.png"))
+
+
+def test_cli_with_a_single_pipeline(tmp_path, capsys, monkeypatch):
+    specs = tmp_path / "thumbs.json"
+    specs.write_text(json.dumps({
+        "format": "png",
+        "operations": [["resize_to_limit", [100, 100], {}]],
+    }))
+    output = tmp_path / "thumbs"
+    pattern = fixture_image("[pl][oa][nr]*.jpg")
+
+    assert main([str(specs), pattern, "-o", str(output), "-w", "1"]) == 0
+    assert_dimensions([75, 100], str(output / "portrait.png"))
+    assert_dimensions([100, 75], str(output / "landscape.png"))
+    captured = capsys.readouterr()
+    assert "2 processed, 0 skipped, 0 failed" in captured.err
+
+    monkeypatch.setattr("sys.stdin", io.StringIO(f"{portrait}\n\n{portrait}\n"))
+    args = [str(specs), "--sources-from", "-", "-o", str(output), "-w", "1"]
+    assert main(args + ["--skip", "mtime"]) == 0
+    assert "0 processed, 1 skipped" in capsys.readouterr().err
+
+
+def test_cli_skips_by_hash(tmp_path, capsys):
+    specs = tmp_path / "thumbs.yaml"
+    specs.write_text(
+        "destination: '{stem}-small.jpg'\n"
+        "operations: [[resize_to_limit, [100, 100], {}]]\n"
+    )
+    args = [str(specs), portrait, "-o", str(tmp_path), "--skip", "hash", "-w", "1"]
+
+    assert main(args) == 0
+    assert_dimensions([75, 100], str(tmp_path / "portrait-small.jpg"))
+    assert "1 processed, 0 skipped" in capsys.readouterr().err
+    assert (tmp_path / ".image-processing.json").exists()
+
+    assert main(args) == 0
+    assert "0 processed, 1 skipped" in capsys.readouterr().err
+
+    specs.write_text(
+        "destination: '{stem}-small.jpg'\n"
+        "operations: [[resize_to_limit, [50, 50], {}]]\n"
+    )
+    assert main(args) == 0
+    assert "1 processed, 0 skipped" in capsys.readouterr().err
+    image = pyvips.Image.new_from_file(
+        str(tmp_path / "portrait-small.jpg"), revalidate=True
+    )
+    assert (image.width, image.height) == (38, 50)
+
+
+def test_cli_requires_sources_for_a_single_pipeline(tmp_path):
+    specs = tmp_path / "thumbs.json"
+    specs.write_text(json.dumps({"format": "png"}))
+    with pytest.raises(SystemExit):
+        main([str(specs)])
+
+
+def test_cli_requires_an_output_dir_or_a_destination(tmp_path, capsys):
+    specs = tmp_path / "thumbs.json"
+    specs.write_text(json.dumps({"format": "png"}))
+    with pytest.raises(SystemExit):
+        main([str(specs), portrait])
+    assert "--output-dir or a destination" in capsys.readouterr().err
+
+
+def test_cli_keeps_the_paths_relative_to_the_glob_root(tmp_path):
+    photos = tmp_path / "photos"
+    for folder in ("a", "b"):
+        (photos / folder).mkdir(parents=True)
+        shutil.copyfile(portrait, photos / folder / "1.jpg")
+    specs = tmp_path / "thumbs.json"
+    specs.write_text(json.dumps({"format": "png"}))
+    output = tmp_path / "thumbs"
+
+    pattern = str(photos / "**" / "*.jpg")
+    assert main([str(specs), pattern, "-o", str(output), "-w", "1", "-q"]) == 0
+    assert_format("PNG", str(output / "a" / "1.png"))
+    assert_format("PNG", str(output / "b" / "1.png"))
+
+
+def test_cli_rejects_sources_with_the_same_destination(tmp_path, monkeypatch, capsys):
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        shutil.copyfile(portrait, tmp_path / folder / "1.jpg")
+    specs = tmp_path / "thumbs.json"
+    specs.write_text(json.dumps({"format": "png"}))
+    sources = f"{tmp_path / 'a' / '1.jpg'}\n{tmp_path / 'b' / '1.jpg'}\n"
+    monkeypatch.setattr("sys.stdin", io.StringIO(sources))
+
+    with pytest.raises(SystemExit):
+        main([str(specs), "--sources-from", "-", "-o", str(tmp_path / "thumbs")])
+    assert "have the same destination" in capsys.readouterr().err
+    assert not (tmp_path / "thumbs").exists()
+
+
+def save_or_crash(options, destination):
+    # Module-level, so the workers can unpickle it
+    if options["source"].endswith("crash.jpg"):
+        os._exit(1)
+    return batch.save_in_worker(options, destination)
+
+
+def test_batch_save_reports_pipelines_that_cant_be_sent(tmp_path):
+    overlay = pyvips.Image.black(10, 10)
+    pipeline = ImageProcessing(portrait).resize_to_limit(100, 100)
+    pipelines = [pipeline, pipeline.composite(overlay), pipeline.source(landscape)]
+    results = sorted(batch_save(pipelines, workers=1))
+    assert [result.index for result in results] == [0, 1, 2]
+    assert results[0].error == results[2].error == ""
+    assert results[1].destination == ""
+    assert results[1].error
+
+
+def test_batch_save_restarts_the_pool_after_a_worker_dies(monkeypatch, tmp_path):
+    monkeypatch.setattr(batch, "save_in_worker", save_or_crash)
+    crash = tmp_path / "crash.jpg"
+    shutil.copyfile(portrait, crash)
+    pipeline = ImageProcessing().resize_to_limit(100, 100)
+    sources = [str(crash)] + [portrait] * (batch.PREFETCH * 2)
+    results = sorted(batch_save((pipeline.source(s) for s in sources), workers=1))
+
+    assert len(results) == len(sources)
+    assert results[0].error.startswith("BrokenProcessPool: ")
+    # The ones submitted after the crash are processed by a new pool
+    assert all(not result.error for result in results[batch.PREFETCH:])
+
+
+def test_cli_reports_missing_files(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main([str(tmp_path / "missing.json")])
+    assert "missing.json" in capsys.readouterr().err
+
+    specs = tmp_path / "thumbs.json"
+    specs.write_text(json.dumps({"format": "png"}))
+    with pytest.raises(SystemExit):
+        main([str(specs), "--sources-from", str(tmp_path / "missing.txt"), "-o", "x"])
+    assert "missing.txt" in capsys.readouterr().err
+
+
+def test_batch_save_accounts_for_temp_results(monkeypatch):
+    store = TempStore()
+    monkeypatch.setattr(temp, "_default_temp_store", store)
+    pipeline = ImageProcessing(portrait).resize_to_limit(100, 100)
+    [result] = batch_save([pipeline], workers=1)
+    assert os.path.dirname(result.destination) == str(store.folder)
+    assert store.size == os.path.getsize(result.destination)
+    store.cleanup()
+
+
+def test_workers_get_the_configuration_of_the_parent():
+    config = get_config()
+    try:
+        batch.init_worker(2, {**config, "cache_max": 7})
+        assert get_config() == {**config, "cache_max": 7, "threads": 2}
+    finally:
+        configure(**config)
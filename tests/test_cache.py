@@ -0,0 +1,172 @@
+import os
+import shutil
+import time
+from unittest.mock import MagicMock
+
+import pytest
+import pyvips
+
+from image_processing import ImageProcessing
+from image_processing import ResultCache
+
+from .utils import assert_dimensions
+from .utils import fixture_image
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.jpg"
+    shutil.copyfile(fixture_image("portrait.jpg"), path)
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path / "cache")
+
+
+def test_reuses_cached_result(source, cache):
+    pipeline = ImageProcessing(source, cache=cache).resize_to_limit(400, 400)
+    result1 = pipeline.save()
+    assert_dimensions([300, 400], result1)
+
+    pipeline._processor.save = MagicMock()
+    result2 = pipeline.save()
+    assert result1 == result2
+    pipeline._processor.save.assert_not_called()
+
+
+def test_different_options_are_different_entries(source, cache):
+    pipeline = ImageProcessing(source, cache=cache)
+    result1 = pipeline.resize_to_limit(400, 400).save()
+    result2 = pipeline.resize_to_limit(200, 200).save()
+    assert result1 != result2
+    assert_dimensions([150, 200], result2)
+
+
+def test_changed_source_invalidates_entry(source, cache):
+    pipeline = ImageProcessing(source, cache=cache).resize_to_limit(400, 400)
+    result1 = pipeline.save()
+
+    shutil.copyfile(fixture_image("landscape.jpg"), source)
+    result2 = pipeline.save()
+    assert result1 != result2
+
+
+def test_changed_overlay_invalidates_entry(source, cache, tmp_path):
+    overlay = tmp_path / "watermark.png"
+    pyvips.Image.black(10, 10).write_to_file(str(overlay))
+    pipeline = ImageProcessing(source, cache=cache).composite(str(overlay))
+    result1 = pipeline.save()
+    assert pipeline.save() == result1
+
+    pyvips.Image.black(20, 20).write_to_file(str(overlay))
+    result2 = pipeline.save()
+    assert result1 != result2
+
+
+def test_entry_evicted_after_it_was_found(source, cache, monkeypatch):
+    pipeline = ImageProcessing(source, cache=cache).resize_to_limit(400, 400)
+    result = pipeline.save()
+    utime = os.utime
+
+    def evict_first(path, times):
+        os.remove(path)
+        utime(path, times)
+
+    monkeypatch.setattr(os, "utime", evict_first)
+    assert cache.get(os.path.basename(result)) is None
+
+
+def test_processes_the_entry_evicted_before_copying_it(source, cache, tmp_path):
+    pipeline = ImageProcessing(source, cache=cache).resize_to_limit(400, 400)
+    cached = pipeline.save()
+    cache.get = lambda filename: cached  # found, then evicted by another worker
+    os.remove(cached)
+    result = pipeline.save(tmp_path / "result.jpg")
+    assert_dimensions([300, 400], result)
+
+
+def test_hash_source(source, tmp_path):
+    cache = ResultCache(tmp_path / "cache", hash_source=True)
+    pipeline = ImageProcessing(source, cache=cache).resize_to_limit(400, 400)
+    result1 = pipeline.save()
+
+    os.utime(source, (0, 0))
+    assert result1 == pipeline.save()
+
+
+def test_copies_cached_result_to_destination(source, cache, tmp_path):
+    pipeline = ImageProcessing(source, cache=cache).resize_to_limit(400, 400)
+    cached = pipeline.save()
+    result = pipeline.save(tmp_path / "result.jpg")
+    assert result == str(tmp_path / "result.jpg")
+    assert os.path.getsize(cached) == os.path.getsize(result)
+
+
+def test_doesnt_leave_temp_files_on_errors(tmp_path, cache):
+    invalid = fixture_image("invalid.jpg")
+    pipeline = ImageProcessing(invalid, cache=cache).loader(fail=True)
+    with pytest.raises(Exception):
+        pipeline.resize_to_limit(400, 400).save()
+    assert os.listdir(cache.folder) == []
+
+
+def test_evicts_least_recently_used(source, tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    pipeline = ImageProcessing(source, cache=cache)
+    result1 = pipeline.resize_to_limit(400, 400).save()
+    os.utime(result1, (time.time() - 60, time.time() - 60))
+    result2 = pipeline.resize_to_limit(300, 300).save()
+
+    cache.max_size = os.path.getsize(result2)
+    cache.evict()
+    assert not os.path.exists(result1)
+    assert os.path.exists(result2)
+
+
+def test_evicts_expired(source, tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_age=30)
+    pipeline = ImageProcessing(source, cache=cache).resize_to_limit(400, 400)
+    result = pipeline.save()
+    os.utime(result, (time.time() - 60, time.time() - 60))
+
+    assert cache.get(os.path.basename(result)) is None
+    assert not os.path.exists(result)
+
+
+def test_only_scans_the_folder_when_over_the_limits(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path / "cache", max_size=1000)
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: scans.append(1) or evict())
+
+    def add(name, size):
+        temp_path = cache.get_temp_path(name)
+        with open(temp_path, "wb") as f:
+            f.write(b"x" * size)
+        return cache.set(name, temp_path)
+
+    first = add("0.jpg", 100)
+    os.utime(first, (time.time() - 60, time.time() - 60))
+    for index in range(1, 9):
+        add(f"{index}.jpg", 100)
+    assert len(scans) == 1  # the first one, to know the size of the folder
+
+    add("9.jpg", 200)
+    assert len(scans) == 2
+    assert not os.path.exists(first)
+    assert sum(entry.stat().st_size for entry in os.scandir(cache.folder)) == 1000
+
+
+def test_scans_the_folder_every_evict_interval(tmp_path, monkeypatch):
+    monkeypatch.setattr("image_processing.cache.EVICT_INTERVAL", 3)
+    cache = ResultCache(tmp_path / "cache", max_age=30)
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: scans.append(1) or evict())
+
+    for index in range(7):
+        temp_path = cache.get_temp_path(f"{index}.jpg")
+        cache.set(f"{index}.jpg", temp_path)
+    assert len(scans) == 3
@@ -1,8 +1,12 @@
+import shutil
 from pathlib import Path
 
 import pytest
 import pyvips
 from image_processing import ImageProcessing
+from image_processing.vips_processor import OverlayCache
+from image_processing.vips_processor import VipsProcessor
+from image_processing.vips_processor import overlay_cache
 
 from .utils import (
     assert_different,
@@ -91,3 +95,50 @@ def test_overlay_with_alpha():
         .composite(fixture_image("alpha.png"))
         .save()
     )
+
+
+@pytest.fixture
+def overlay_loads(monkeypatch):
+    overlay_cache.clear()
+    calls = []
+    to_image_with_alpha = VipsProcessor._to_image_with_alpha
+
+    def spy(self, source):
+        calls.append(source)
+        return to_image_with_alpha(self, source)
+
+    monkeypatch.setattr(VipsProcessor, "_to_image_with_alpha", spy)
+    yield calls
+    overlay_cache.clear()
+
+
+def test_caches_overlays(pipeline, overlay_loads):
+    result1 = pipeline.composite(landscape).save()
+    result2 = pipeline.composite(landscape, gravity="centre").save()
+    result3 = pipeline.composite(landscape).save()
+    assert overlay_loads == [landscape]
+    assert_similar(composited, result1)
+    assert_different(composited, result2)
+    assert_similar(composited, result3)
+
+
+def test_overlay_cache_is_invalidated_if_file_changes(
+    pipeline, overlay_loads, tmp_path
+):
+    overlay = tmp_path / "overlay.jpg"
+    shutil.copyfile(landscape, overlay)
+    assert_similar(composited, pipeline.composite(overlay).save())
+
+    shutil.copyfile(fixture_image("portrait.jpg"), overlay)
+    assert_different(composited, pipeline.composite(overlay).save())
+    assert overlay_loads == [str(overlay), str(overlay)]
+
+
+def test_overlay_cache_is_bounded():
+    cache = OverlayCache(max_size=2)
+    image = pyvips.Image.black(1, 1)
+    for key in ["a", "b", "a", "c"]:
+        cache.get(key, lambda: image)
+    assert len(cache) == 2
+    assert cache.get("a", lambda: None) is image
+    assert cache.get("b", lambda: None) is None
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+import pyvips
+
+import image_processing
+from image_processing import ImageProcessing
+from image_processing import aio
+from image_processing import configure
+from image_processing import configure_from_env
+from image_processing import get_stats
+from image_processing import temp
+
+from .utils import assert_dimensions
+from .utils import fixture_image
+
+
+def test_configure():
+    stats = get_stats()
+    try:
+        configure(threads=2, cache_max=10, cache_max_mem=1024**2, cache_max_files=5)
+        assert get_stats() == {
+            "threads": 2,
+            "cache_size": pyvips.cache_get_size(),
+            "cache_max": 10,
+            "cache_max_mem": 1024**2,
+            "cache_max_files": 5,
+        }
+    finally:
+        configure(
+            threads=stats["threads"],
+            cache_max=stats["cache_max"],
+            cache_max_mem=stats["cache_max_mem"],
+            cache_max_files=stats["cache_max_files"],
+        )
+
+
+def test_configure_default_async_runner():
+    runner = aio.get_default_runner()
+    try:
+        configure(async_workers=3, async_max_pending=7)
+        new_runner = aio.get_default_runner()
+        assert new_runner.max_workers == 3
+        assert new_runner.max_pending == 7
+    finally:
+        aio.set_default_runner(runner)
+
+
+def test_configure_keeps_the_other_async_runner_values():
+    runner = aio.get_default_runner()
+    try:
+        configure(async_workers=3, async_max_pending=7)
+        old_runner = aio.get_default_runner()
+        old_runner._get_executor()
+        configure(async_workers=2)
+        new_runner = aio.get_default_runner()
+        assert (new_runner.max_workers, new_runner.max_pending) == (2, 7)
+        assert old_runner._executor is None
+    finally:
+        aio.set_default_runner(runner)
+
+
+def test_configure_keeps_the_other_temp_store_values(monkeypatch):
+    monkeypatch.setattr(os, "access", lambda path, mode: True)
+    monkeypatch.setattr(temp, "_default_temp_store", None)
+    configure(temp_tmpfs=True)
+    configure(temp_max_size=1024)
+    store = temp.get_default_temp_store()
+    assert (store.parent, store.max_size) == (temp.TMPFS_FOLDER, 1024)
+
+    configure(temp_tmpfs=False)
+    store = temp.get_default_temp_store()
+    assert (store.parent, store.max_size) == (None, 1024)
+
+
+def test_configure_from_env_parses_booleans(monkeypatch):
+    monkeypatch.setattr(temp, "_default_temp_store", None)
+    for value, expected in [("true", True), ("No", False), ("1", True)]:
+        options = configure_from_env({"IMAGE_PROCESSING_TEMP_TMPFS": value})
+        assert options == {"temp_tmpfs": expected}
+
+
+def test_configure_from_env_names_invalid_variables():
+    with pytest.raises(ValueError, match="IMAGE_PROCESSING_TEMP_TMPFS"):
+        configure_from_env({"IMAGE_PROCESSING_TEMP_TMPFS": "maybe"})
+    with pytest.raises(ValueError, match="IMAGE_PROCESSING_THREADS"):
+        configure_from_env({"IMAGE_PROCESSING_THREADS": "many"})
+
+
+def test_configure_from_env():
+    stats = get_stats()
+    try:
+        options = configure_from_env({
+            "IMAGE_PROCESSING_CACHE_MAX": "20",
+            "IMAGE_PROCESSING_THREADS": " ",
+            "OTHER": "1",
+        })
+        assert options == {"cache_max": 20}
+        assert get_stats()["cache_max"] == 20
+    finally:
+        configure(cache_max=stats["cache_max"])
+
+
+def test_configure_is_exported():
+    assert image_processing.configure is configure
+
+
+def test_access():
+    pipeline = ImageProcessing(fixture_image("portrait.jpg")).access("sequential")
+    assert pipeline.options["loader"] == {"access": "sequential"}
+    assert_dimensions([600, 800], pipeline.invert().save())
+    assert_dimensions([300, 400], pipeline.resize_to_limit(400, 400).save())
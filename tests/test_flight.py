@@ -0,0 +1,145 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from image_processing import ImageProcessing
+from image_processing import SingleFlight
+from image_processing.vips_processor import VipsProcessor
+
+from .utils import assert_dimensions
+from .utils import fixture_image
+
+
+portrait = fixture_image("portrait.jpg")
+
+
+@pytest.fixture
+def save_calls(monkeypatch):
+    """Make the processing slow enough for the calls to overlap."""
+    calls = []
+    save = VipsProcessor.save
+
+    def spy(self, **kw):
+        calls.append(kw["destination"])
+        time.sleep(0.2)
+        return save(self, **kw)
+
+    monkeypatch.setattr(VipsProcessor, "save", spy)
+    return calls
+
+
+def save_concurrently(pipelines):
+    with ThreadPoolExecutor(len(pipelines)) as executor:
+        futures = [executor.submit(pipeline.save) for pipeline in pipelines]
+        return [future.result() for future in futures]
+
+
+def test_coalesces_identical_pipelines(save_calls):
+    flight = SingleFlight()
+    pipeline = ImageProcessing(portrait, single_flight=flight).resize_to_limit(400, 400)
+    results = save_concurrently([pipeline] * 4)
+    assert len(save_calls) == 1
+    assert len(set(results)) == 1
+    for result in results:
+        assert_dimensions([300, 400], result)
+    assert flight.in_flight == 0
+
+    save_concurrently([pipeline] * 2)
+    assert len(save_calls) == 2
+
+
+def test_doesnt_coalesce_different_pipelines(save_calls):
+    pipeline = ImageProcessing(portrait, single_flight=SingleFlight())
+    save_concurrently([
+        pipeline.resize_to_limit(400, 400),
+        pipeline.resize_to_limit(300, 300),
+        pipeline.resize_to_limit(400, 400).convert("png"),
+    ])
+    assert len(save_calls) == 3
+
+
+def test_copies_the_result_to_each_destination(save_calls, tmp_path):
+    pipeline = ImageProcessing(portrait, single_flight=SingleFlight()) \
+        .resize_to_limit(400, 400)
+    with ThreadPoolExecutor(2) as executor:
+        futures = [
+            executor.submit(pipeline.save, tmp_path / f"{name}.jpg")
+            for name in ("first", "second")
+        ]
+        results = sorted(future.result() for future in futures)
+    assert len(save_calls) == 1
+    assert results == [str(tmp_path / "first.jpg"), str(tmp_path / "second.jpg")]
+    first, second = (Path(result).read_bytes() for result in results)
+    assert first == second
+
+
+def test_shares_the_errors(save_calls):
+    invalid = fixture_image("invalid.jpg")
+    pipeline = ImageProcessing(invalid, single_flight=SingleFlight()) \
+        .loader(fail=True).resize_to_limit(400, 400)
+    with ThreadPoolExecutor(3) as executor:
+        futures = [executor.submit(pipeline.save) for _ in range(3)]
+        errors = [future.exception() for future in futures]
+    assert len(save_calls) == 1
+    assert all(errors)
+
+
+def test_coalesces_coroutines(save_calls):
+    pipeline = ImageProcessing(portrait, single_flight=SingleFlight()) \
+        .resize_to_limit(400, 400)
+
+    async def main():
+        return await asyncio.gather(*[pipeline.save_async() for _ in range(4)])
+
+    results = asyncio.run(main())
+    assert len(save_calls) == 1
+    assert len(set(results)) == 1
+    for result in results:
+        assert_dimensions([300, 400], result)
+
+
+def test_cancelling_the_first_coroutine_doesnt_cancel_the_others(save_calls):
+    flight = SingleFlight()
+    pipeline = ImageProcessing(portrait, single_flight=flight) \
+        .resize_to_limit(400, 400)
+
+    async def main():
+        leader = asyncio.ensure_future(pipeline.save_async())
+        await asyncio.sleep(0.05)
+        followers = [asyncio.ensure_future(pipeline.save_async()) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    results = asyncio.run(main())
+    assert len(save_calls) == 1
+    for result in results:
+        assert_dimensions([300, 400], result)
+    assert flight.in_flight == 0
+
+
+def test_coalesces_across_processes_with_a_lock_folder(save_calls, tmp_path):
+    # Each process has its own `SingleFlight`, only sharing the lock folder
+    pipelines = [
+        ImageProcessing(portrait, single_flight=SingleFlight(tmp_path / "locks"))
+        .resize_to_limit(400, 400)
+        for _ in range(3)
+    ]
+    results = save_concurrently(pipelines)
+    assert len(save_calls) == 1
+    for result in results:
+        assert_dimensions([300, 400], result)
+    assert list((tmp_path / "locks").iterdir()) == []
+
+
+def test_run_locked_only_shares_results_of_overlapping_calls(tmp_path):
+    flight = SingleFlight(tmp_path)
+    result = tmp_path / "result.txt"
+    result.write_text("")
+    assert flight.run_locked("key", lambda: str(result)) == (str(result), False)
+    assert flight.run_locked("key", lambda: "other") == ("other", False)
@@ -0,0 +1,89 @@
+import pytest
+import pyvips
+
+from image_processing import ImageProcessing
+from image_processing import formats
+from image_processing import get_encoder_options
+from image_processing import negotiate_format
+
+from .utils import fixture_image
+
+
+portrait = fixture_image("portrait.jpg")
+
+
+@pytest.fixture
+def all_supported(monkeypatch):
+    monkeypatch.setattr(formats, "is_supported", lambda format: True)
+
+
+def test_negotiate_format_by_target(all_supported):
+    accept = "image/avif,image/webp,image/apng,image/*,*/*;q=0.8"
+    assert negotiate_format(accept, "smallest") == "avif"
+    assert negotiate_format(accept, "balanced") == "webp"
+    assert negotiate_format(accept, "fastest") == "jpeg"
+
+
+def test_negotiate_format_accepts_lists(all_supported):
+    assert negotiate_format(["png", "webp"], "fastest") == "webp"
+    assert negotiate_format(["jpg"], "smallest") == "jpeg"
+
+
+def test_negotiate_format_skips_refused_formats(all_supported):
+    assert negotiate_format("image/avif;q=0, image/webp", "smallest") == "webp"
+
+
+def test_negotiate_format_skips_unsupported_formats(monkeypatch):
+    monkeypatch.setattr(formats, "is_supported", lambda format: format != "avif")
+    assert negotiate_format("image/avif,image/webp", "smallest") == "webp"
+
+
+def test_negotiate_format_with_alpha(all_supported):
+    assert negotiate_format(["jpeg", "png"], "fastest", alpha=True) == "png"
+    assert negotiate_format("text/html", alpha=True) == "png"
+    assert negotiate_format("text/html") == "jpeg"
+
+
+def test_negotiate_format_fails_on_unknown_target():
+    with pytest.raises(ValueError):
+        negotiate_format("image/webp", "tiniest")
+
+
+def test_get_encoder_options():
+    assert get_encoder_options("jpg", "fastest")["optimize_coding"] is False
+    assert get_encoder_options("png", "smallest")["palette"] is True
+    assert get_encoder_options("gif") == {}
+
+
+@pytest.mark.parametrize("target", formats.TARGETS)
+@pytest.mark.parametrize("format", ["webp", "jpeg", "png"])
+def test_presets_are_accepted_by_libvips(format, target):
+    data = (
+        ImageProcessing(portrait)
+        .resize_to_limit(100, 100)
+        .negotiate([format], target)
+        .save_to_buffer()
+    )
+    loader = pyvips.Image.new_from_buffer(data, "").get("vips-loader")
+    assert loader.startswith(format)
+
+
+def test_negotiate_keeps_the_saver_options(all_supported):
+    pipeline = ImageProcessing(portrait).saver(strip=False).negotiate("image/webp")
+    assert pipeline.options["format"] == "webp"
+    assert pipeline.options["saver"] == {"effort": 4, "strip": False}
+
+
+def test_negotiate_uses_the_options_of_the_saved_format(all_supported, tmp_path):
+    pipeline = ImageProcessing(portrait).saver(interlace=True) \
+        .negotiate(["jpeg"], "fastest").resize_to_limit(100, 100)
+    assert pipeline._get_saver("png") == {
+        "compression": 1,
+        "strip": True,
+        "interlace": True,
+    }
+
+    result = pipeline.save(tmp_path / "result.png")
+    assert pyvips.Image.new_from_file(result).get("vips-loader") == "pngload"
+    data = pipeline.save_to_buffer("png")
+    assert pyvips.Image.new_from_buffer(data, "").get("vips-loader") == "pngload_buffer"
@@ -163,3 +163,97 @@ def test_save_to_custom_temp_folder():
         pp._processor.save = MagicMock()
         finalpath = pp.save()
         assert finalpath.startswith(temp)
+
+
+def test_save_many_calls_processor_once():
+    pp = ImageProcessing(str_source).convert("png")
+    pp._processor.save_many = MagicMock(return_value=["a.png", "b.png"])
+    results = pp.save_many(
+        {
+            "large": pp.resize_to_limit(800, 800),
+            "small": pp.resize_to_limit(300, 300),
+        },
+        destinations={"large": "large"},
+    )
+    assert results == {"large": "a.png", "small": "b.png"}
+
+    _, kw = pp._processor.save_many.call_args
+    assert kw["source"] == str_source
+    branches = kw["branches"]
+    assert branches[0][0] == [("resize_to_limit", (800, 800), {})]
+    assert branches[0][1] == "large.png"
+    assert branches[1][1].endswith(".png")
+
+
+def test_save_many_requires_the_same_source():
+    pp = ImageProcessing(str_source)
+    with pytest.raises(ValueError):
+        pp.save_many({"other": pp.source(str_source2)})
+    with pytest.raises(ValueError):
+        pp.save_many({"other": pp.loader(page=2)})
+
+
+def test_compile_fails_on_unknown_operations():
+    with pytest.raises(AttributeError):
+        ImageProcessing(str_source).resize_to_limt(400, 400).compile()
+
+
+def test_compile_accepts_pyvips_operations():
+    plan = ImageProcessing().resize_to_limit(400, 400).invert().compile()
+    assert plan.options["operations"] == [
+        ("resize_to_limit", (400, 400), {}),
+        ("invert", (), {}),
+    ]
+
+
+def test_plan_is_hashable():
+    pp = ImageProcessing().convert("png")
+    plan1 = pp.resize_to_limit(400, 400, crop=[1, 2]).compile()
+    plan2 = pp.resize_to_limit(400, 400, crop=[1, 2]).compile()
+    plan3 = pp.resize_to_limit(300, 300).compile()
+    assert plan1 == plan2
+    assert hash(plan1) == hash(plan2)
+    assert plan1 != plan3
+    assert len({plan1, plan2, plan3}) == 2
+
+
+def test_plan_save():
+    pp = ImageProcessing().resize_to_limit(400, 400)
+    pp._processor.save = MagicMock()
+    plan = pp.compile()
+    plan.save(str_source, "destination.png")
+    plan.save(str_source2, "destination.png")
+
+    _, kw = pp._processor.save.call_args
+    assert kw["source"] == str_source2
+    assert kw["operations"] == [("resize_to_limit", (400, 400), {})]
+    assert kw["destination"] == "destination.png"
+
+
+def test_branches_share_operations():
+    pp = ImageProcessing(str_source).resize_to_limit(400, 400).strip()
+    branch1 = pp.invert()
+    branch2 = pp.sharpen()
+    assert branch1._operations.parent is pp._operations
+    assert branch2._operations.parent is pp._operations
+    assert pp.options["operations"] == [
+        ("resize_to_limit", (400, 400), {}),
+        ("strip", (), {}),
+    ]
+    assert branch1.options["operations"][-1] == ("invert", (), {})
+    assert branch2.options["operations"][-1] == ("sharpen", (), {})
+
+
+def test_options_dont_modify_the_pipeline():
+    pp = ImageProcessing(str_source).loader(page=1).resize_to_limit(400, 400)
+    options = pp.options
+    options["loader"]["page"] = 2
+    options["operations"].append(("strip", (), {}))
+    assert pp.options["loader"] == {"page": 1}
+    assert len(pp.options["operations"]) == 1
+
+
+def test_from_options_keeps_the_operations_order():
+    pp = ImageProcessing(str_source).resize_to_limit(400, 400).strip().invert()
+    copy = ImageProcessing.from_options(pp.options)
+    assert copy.options == pp.options
@@ -0,0 +1,102 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import image_processing
+from image_processing.lazy import LazyModule
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# About 6 ms here; the best of `IMPORT_TIME_RUNS` runs is compared, so the
+# load of the machine doesn't make the test flaky
+IMPORT_TIME_BUDGET = 0.01
+IMPORT_TIME_RUNS = 3
+
+
+def run_python(code, *options):
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        check=True,
+        cwd=str(ROOT),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+
+def get_loaded_modules(code):
+    code += "\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"
+    return set(json.loads(run_python(code).stdout))
+
+
+@pytest.mark.parametrize("module", ["pyvips", "asyncio", "concurrent.futures"])
+def test_import_doesnt_load_heavy_modules(module):
+    assert module not in get_loaded_modules("import image_processing")
+
+
+def test_building_options_doesnt_load_pyvips():
+    modules = get_loaded_modules(
+        "from image_processing import ImageProcessing\n"
+        "ImageProcessing('a.jpg').resize_to_limit(400, 400).convert('webp').options"
+    )
+    assert "image_processing.image_processing" in modules
+    assert "pyvips" not in modules
+
+
+def test_import_time():
+    """The time spent importing the modules of the package itself,
+    without the standard library ones it uses.
+    """
+    import_time = min(get_import_time() for _ in range(IMPORT_TIME_RUNS))
+    assert 0 < import_time < IMPORT_TIME_BUDGET
+
+
+def get_import_time():
+    stderr = run_python("import image_processing", "-X", "importtime").stderr
+    total = 0
+    for line in stderr.splitlines():
+        _, self_time, _, name = line.replace(":", "|", 1).split("|")
+        name = name.strip()
+        if name.startswith("image_processing"):
+            total += int(self_time)
+    return total / 1e6
+
+
+def test_exports_names_lazily():
+    assert "ImageProcessing" in dir(image_processing)
+    pipeline_class = image_processing.ImageProcessing
+    assert pipeline_class.__module__ == "image_processing.image_processing"
+    with pytest.raises(AttributeError):
+        image_processing.Missing  # noqa: B018
+
+
+def test_star_import_exports_the_lazy_names():
+    code = (
+        "from image_processing import *\n"
+        "print(ImageProcessing.__name__, VipsProcessor.__name__, DEFAULT_FORMAT)\n"
+        "print(callable(configure), callable(batch_save))"
+    )
+    output = run_python(code).stdout.split()
+    assert output == ["ImageProcessing", "VipsProcessor", "jpeg", "True", "True"]
+
+
+def test_exports_the_names_of_the_previous_versions():
+    assert {"ImageProcessing", "VipsProcessor", "DEFAULT_FORMAT"} <= set(
+        image_processing.__all__
+    )
+    assert image_processing.DEFAULT_FORMAT == "jpeg"
+    assert image_processing.VipsProcessor.__module__ == (
+        "image_processing.vips_processor"
+    )
+
+
+def test_lazy_module():
+    module = LazyModule("colorsys")
+    assert module.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert module.loaded
+    with pytest.raises(AttributeError):
+        module.missing
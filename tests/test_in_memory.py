@@ -0,0 +1,134 @@
+import io
+from pathlib import Path
+
+import pyvips
+import pytest
+
+from image_processing import ImageProcessing
+
+from .utils import assert_dimensions
+from .utils import assert_similar
+from .utils import fixture_image
+
+
+portrait = fixture_image("portrait.jpg")
+
+
+@pytest.fixture
+def data():
+    return Path(portrait).read_bytes()
+
+
+def test_accepts_bytes_source(data):
+    result = ImageProcessing(data).resize_to_limit(400, 400).save()
+    assert_dimensions([300, 400], result)
+    assert result.endswith(".jpeg")
+    assert_similar(fixture_image("limit.jpg"), result)
+
+
+def test_bytes_sources_keep_their_format():
+    data = Path(fixture_image("alpha.png")).read_bytes()
+    pipeline = ImageProcessing(data).resize_to_limit(100, 100)
+    result = pipeline.save()
+    assert result.endswith(".png")
+    assert pyvips.Image.new_from_file(result).hasalpha()
+    image = pyvips.Image.new_from_buffer(pipeline.save_to_buffer(), "")
+    assert image.get("vips-loader") == "pngload_buffer"
+
+
+def test_accepts_bytearray_and_memoryview_sources(data):
+    result = ImageProcessing(bytearray(data)).resize_to_limit(400, 400).save()
+    assert_dimensions([300, 400], result)
+    result = ImageProcessing(memoryview(data)).invert().save()
+    assert_dimensions([600, 800], result)
+
+
+def test_accepts_file_like_source(data):
+    result = ImageProcessing(io.BytesIO(data)).resize_to_limit(400, 400).save()
+    assert_dimensions([300, 400], result)
+
+    with open(portrait, "rb") as f:
+        result = ImageProcessing().source(f).rotate(90).save()
+    assert_dimensions([800, 600], result)
+
+
+def test_in_memory_sources_are_auto_rotated():
+    data = Path(fixture_image("rotated.jpg")).read_bytes()
+    assert_dimensions([600, 800], ImageProcessing(data).save())
+    assert_dimensions(
+        [600, 800],
+        ImageProcessing(data).resize_to_limit(1000, 1000).save()
+    )
+    assert_dimensions(
+        [800, 600],
+        ImageProcessing(io.BytesIO(data)).loader(autorot=False).save()
+    )
+
+
+def test_temp_filename_depends_on_the_content(data):
+    pipeline1 = ImageProcessing(data).resize_to_limit(400, 400)
+    pipeline2 = ImageProcessing(bytes(data)).resize_to_limit(400, 400)
+    pipeline3 = ImageProcessing(data[:-1]).resize_to_limit(400, 400)
+    assert pipeline1.get_temp_filename() == pipeline2.get_temp_filename()
+    assert pipeline1.get_temp_filename() != pipeline3.get_temp_filename()
+
+
+def test_save_to_buffer():
+    data = ImageProcessing(portrait).resize_to_limit(400, 400).save_to_buffer()
+    image = pyvips.Image.new_from_buffer(data, "")
+    assert [image.width, image.height] == [300, 400]
+    assert image.get("vips-loader") == "jpegload_buffer"
+
+
+def test_save_to_buffer_with_format(data):
+    result = ImageProcessing(data).convert("webp").save_to_buffer()
+    assert pyvips.Image.new_from_buffer(result, "").get("vips-loader") == "webpload_buffer"
+    result = ImageProcessing(data).save_to_buffer("png")
+    assert pyvips.Image.new_from_buffer(result, "").get("vips-loader") == "pngload_buffer"
+
+
+def test_save_to_stream(tmp_path):
+    stream = io.BytesIO()
+    ImageProcessing(portrait).resize_to_limit(400, 400).save_to_stream(stream)
+    image = pyvips.Image.new_from_buffer(stream.getvalue(), "")
+    assert [image.width, image.height] == [300, 400]
+
+    destination = tmp_path / "result.tiff"
+    with open(destination, "w+b") as f:
+        ImageProcessing(portrait).save_to_stream(f, "tiff")
+    assert_dimensions([600, 800], str(destination))
+
+
+def chunked(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_accepts_iterable_source(data):
+    result = ImageProcessing(chunked(data, 1000)).resize_to_limit(400, 400).save()
+    assert_dimensions([300, 400], result)
+    assert_similar(fixture_image("limit.jpg"), result)
+
+    result = ImageProcessing(chunked(data, 100_000)).invert().save()
+    assert_dimensions([600, 800], result)
+
+    result = ImageProcessing(list(chunked(data, 5000))).rotate(90).save()
+    assert_dimensions([800, 600], result)
+
+
+def test_streams_from_iterable_to_stream(tmp_path):
+    source = tmp_path / "big.png"
+    pyvips.Image.black(2000, 1500, bands=3).write_to_file(str(source))
+
+    def read_chunks():
+        with open(source, "rb") as f:
+            yield from iter(lambda: f.read(64 * 1024), b"")
+
+    stream = io.BytesIO()
+    ImageProcessing(read_chunks()) \
+        .loader(access="sequential") \
+        .invert() \
+        .save_to_stream(stream, "png")
+    image = pyvips.Image.new_from_buffer(stream.getvalue(), "")
+    assert [image.width, image.height] == [2000, 1500]
+    assert image.avg() == 255
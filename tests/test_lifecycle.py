@@ -0,0 +1,154 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+import pyvips
+
+import image_processing
+from image_processing import ImageProcessing
+from image_processing import aio
+from image_processing import lifecycle
+from image_processing import vips_processor
+from image_processing.vips_processor import get_sharpen_mask
+from image_processing.vips_processor import overlay_cache
+
+from .utils import fixture_image
+
+
+portrait = fixture_image("portrait.jpg")
+
+
+@pytest.fixture
+def cached_state():
+    ImageProcessing(portrait).resize_to_limit(400, 400, sharpen="unsharp") \
+        .composite(fixture_image("alpha.png")).save()
+    assert len(overlay_cache) > 0
+    assert get_sharpen_mask.cache_info().currsize > 0
+
+
+def test_init(monkeypatch):
+    calls = []
+    monkeypatch.setattr(lifecycle, "warm_up", calls.append)
+    stats = image_processing.get_stats()
+    try:
+        image_processing.init(["webp"], cache_max=42)
+        assert calls == [["webp"]]
+        # Applied before the next operation
+        assert image_processing.get_stats()["cache_max"] == stats["cache_max"]
+        ImageProcessing(portrait).probe()
+        assert image_processing.get_stats()["cache_max"] == 42
+    finally:
+        image_processing.configure(cache_max=stats["cache_max"])
+
+
+def test_init_and_reinit_dont_call_libvips(monkeypatch, cached_state):
+    def fail(*args, **kw):
+        raise AssertionError("libvips was called")
+
+    for name in ("cache_set_max", "cache_get_max", "concurrency_set", "version"):
+        monkeypatch.setattr(pyvips, name, fail)
+    image_processing.reinit()
+    image_processing.init(threads=2)
+    assert len(overlay_cache) > 0
+    monkeypatch.undo()
+
+    threads = pyvips.concurrency_get()
+    try:
+        ImageProcessing(portrait).resize_to_limit(100, 100).save_to_buffer()
+        assert pyvips.concurrency_get() == 2
+        assert len(overlay_cache) == 0
+        assert vips_processor.pending_reinit is None
+    finally:
+        pyvips.concurrency_set(threads)
+
+
+def test_warm_up():
+    assert image_processing.warm_up(["jpeg", "png", "unknown"]) == ["jpeg", "png"]
+
+
+def test_shutdown(cached_state):
+    runner = aio.get_default_runner()
+    cache_max = pyvips.cache_get_max()
+    image_processing.shutdown()
+
+    assert len(overlay_cache) == 0
+    assert get_sharpen_mask.cache_info().currsize == 0
+    assert pyvips.cache_get_max() == cache_max
+    assert aio.get_default_runner() is not runner
+    # It can still be used afterwards
+    ImageProcessing(portrait).resize_to_limit(400, 400).save()
+
+
+requires_fork = pytest.mark.skipif(
+    not hasattr(os, "register_at_fork"), reason="requires os.register_at_fork()"
+)
+
+
+@requires_fork
+def test_resets_after_fork(cached_state):
+    runner = aio.get_default_runner()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        try:
+            ok = (
+                len(vips_processor.overlay_cache) == 0
+                and vips_processor.inherited_state == [overlay_cache]
+                and aio.get_default_runner() is not runner
+            )
+            image_processing.reinit()
+            ok = ok and vips_processor.inherited_state == [overlay_cache]
+            ImageProcessing(portrait).probe()
+            ok = ok and vips_processor.inherited_state == []
+            os.write(write, b"1" if ok else b"0")
+        finally:
+            os._exit(0)
+
+    os.close(write)
+    assert os.read(read, 1) == b"1"
+    os.close(read)
+    os.waitpid(pid, 0)
+    # The parent keeps its state
+    assert vips_processor.overlay_cache is overlay_cache
+    assert len(overlay_cache) > 0
+    assert aio.get_default_runner() is runner
+
+
+@requires_fork
+def test_forks_while_other_threads_process_images():
+    stop = threading.Event()
+    overlay = fixture_image("alpha.png")
+
+    def process():
+        while not stop.is_set():
+            ImageProcessing(portrait).resize_to_limit(200, 200) \
+                .composite(overlay).save_to_buffer("jpeg")
+            image_processing.get_stats()
+
+    threads = [threading.Thread(target=process) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        pids = []
+        for _ in range(30):
+            time.sleep(0.01)
+            pid = os.fork()
+            if pid == 0:  # pragma: no cover
+                os._exit(0)  # the fork handlers have already run
+            pids.append(pid)
+
+        deadline = time.monotonic() + 10
+        while pids and time.monotonic() < deadline:
+            pids = [pid for pid in pids if os.waitpid(pid, os.WNOHANG) == (0, 0)]
+            time.sleep(0.01)
+        hung = len(pids)
+        for pid in pids:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        assert hung == 0
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
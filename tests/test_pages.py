@@ -0,0 +1,120 @@
+import pytest
+import pyvips
+
+from image_processing import ImageProcessing
+from image_processing.vips_processor import get_page_height
+
+
+@pytest.fixture
+def animated(tmp_path):
+    """A 3-frame 200x100 animated GIF, each frame of a different colour."""
+    frames = [
+        pyvips.Image.black(200, 100, bands=3) + [80 * index, 0, 0]
+        for index in range(3)
+    ]
+    image = pyvips.Image.arrayjoin(frames, across=1).cast("uchar")
+    image = image.copy(interpretation="srgb")
+    image.set_type(pyvips.GValue.gint_type, "page-height", 100)
+    path = str(tmp_path / "animated.gif")
+    image.write_to_file(path)
+    return path
+
+
+def load_pages(path):
+    image = pyvips.Image.new_from_file(path, n=-1)
+    return image, get_page_height(image)
+
+
+def frame_colours(image, page_height):
+    return [
+        round(image.crop(0, top, image.width, page_height)[0].avg())
+        for top in range(0, image.height, page_height)
+    ]
+
+
+def test_loads_the_first_page_by_default(animated):
+    image, page_height = load_pages(ImageProcessing(animated).save())
+    assert (image.width, image.height, page_height) == (200, 100, 100)
+
+
+@pytest.mark.parametrize("operation", ["resize_to_limit", "resize_to_fit"])
+def test_resizes_every_page(animated, operation):
+    pipeline = getattr(ImageProcessing(animated).loader(n=-1), operation)(100, 100)
+    image, page_height = load_pages(pipeline.save())
+    assert (image.width, page_height) == (100, 50)
+    assert image.height == 3 * page_height
+
+    image, page_height = load_pages(pipeline.flatten().save())
+    assert (image.width, page_height) == (100, 50)
+
+
+def test_resize_to_fill_crops_every_page(animated):
+    pipeline = ImageProcessing(animated).loader(n=-1).resize_to_fill(50, 50)
+    image, page_height = load_pages(pipeline.save())
+    assert (image.width, image.height, page_height) == (50, 150, 50)
+    assert frame_colours(image, page_height) == pytest.approx([0, 80, 160], abs=5)
+
+    for pipeline in (
+        pipeline.flatten(),
+        ImageProcessing(animated).loader(n=-1).flatten().resize_to_fill(50, 50),
+    ):
+        image, page_height = load_pages(pipeline.save())
+        assert (image.width, image.height, page_height) == (50, 150, 50)
+
+
+def test_resize_and_pad_pads_every_page(animated):
+    pipeline = ImageProcessing(animated).loader(n=-1).resize_and_pad(100, 100)
+    image, page_height = load_pages(pipeline.save())
+    assert (image.width, image.height, page_height) == (100, 300, 100)
+
+
+def test_rotates_every_page(animated):
+    pipeline = ImageProcessing(animated).loader(n=-1).rotate(90)
+    image, page_height = load_pages(pipeline.save())
+    assert (image.width, image.height, page_height) == (100, 600, 200)
+    assert frame_colours(image, page_height) == pytest.approx([0, 80, 160], abs=5)
+
+    pipeline = ImageProcessing(animated).loader(n=-1).rotate(30)
+    image, page_height = load_pages(pipeline.save())
+    assert image.height == 3 * page_height
+
+
+def test_composites_every_page(animated, tmp_path):
+    overlay = str(tmp_path / "overlay.png")
+    (pyvips.Image.black(20, 20, bands=3) + 255).cast("uchar").write_to_file(overlay)
+
+    pipeline = ImageProcessing(animated).loader(n=-1) \
+        .composite(overlay, gravity="south-east")
+    image, page_height = load_pages(pipeline.save())
+    assert (image.width, image.height, page_height) == (200, 300, 100)
+    for top in range(0, 300, 100):
+        assert image.getpoint(190, top + 90)[:3] == [255, 255, 255]
+        assert image.getpoint(170, top + 90)[1:3] == [0, 0]
+
+
+def test_save_pages(tmp_path):
+    image = pyvips.Image.black(80, 60, bands=3).copy(interpretation="srgb")
+    pages = pyvips.Image.arrayjoin([image, image + 100, image + 200], across=1)
+    pages = pages.cast("uchar")
+    pages.set_type(pyvips.GValue.gint_type, "page-height", 60)
+    source = str(tmp_path / "document.tif")
+    pages.write_to_file(source)
+
+    pipeline = ImageProcessing(source).resize_to_limit(40, 40).convert("png")
+    results = list(pipeline.save_pages(tmp_path / "page.png"))
+    assert results == [str(tmp_path / f"page-{page}.png") for page in range(3)]
+    for page, result in enumerate(results):
+        image = pyvips.Image.new_from_file(result)
+        assert (image.width, image.height) == (40, 30)
+        assert round(image.avg()) == 100 * page
+
+    results = list(pipeline.save_pages(tmp_path / "{page}.png", pages=[2]))
+    assert results == [str(tmp_path / "2.png")]
+
+    results = list(pipeline.save_pages())
+    assert len(set(results)) == 3
+
+
+def test_save_pages_requires_a_seekable_source(animated):
+    with open(animated, "rb") as file, pytest.raises(TypeError):
+        next(ImageProcessing(file).save_pages())
@@ -0,0 +1,78 @@
+import shutil
+
+import pytest
+import pyvips
+
+from image_processing import ImageProcessing
+from image_processing import probe_directory
+from image_processing.vips_processor import VipsProcessor
+
+from .utils import fixture_image
+
+
+portrait = fixture_image("portrait.jpg")
+rotated = fixture_image("rotated.jpg")
+alpha = fixture_image("alpha.png")
+
+
+def test_probe():
+    info = ImageProcessing(portrait).probe()
+    assert info == (600, 800, "jpeg", 1, 1, False)
+    assert info.width == 600
+    assert info.height == 800
+
+
+def test_probe_corrects_the_dimensions_for_the_orientation():
+    info = ImageProcessing(rotated).probe()
+    assert (info.width, info.height, info.orientation) == (600, 800, 6)
+
+    info = ImageProcessing(rotated).loader(autorot=False).probe()
+    assert (info.width, info.height, info.orientation) == (800, 600, 6)
+
+
+def test_probe_alpha_and_format():
+    info = ImageProcessing(alpha).probe()
+    assert info.format == "png"
+    assert info.alpha is True
+
+
+def test_probe_buffers_and_streams():
+    with open(portrait, "rb") as file:
+        data = file.read()
+        file.seek(0)
+        assert ImageProcessing(data).probe().format == "jpeg"
+        assert ImageProcessing(file).probe().width == 600
+
+
+def test_probe_doesnt_decode_the_image(monkeypatch):
+    def fail(*args, **kw):
+        raise AssertionError("the image was decoded")
+
+    image_class = pyvips.Image
+    monkeypatch.setattr(image_class, "write_to_memory", fail)
+    monkeypatch.setattr(image_class, "copy_memory", fail)
+    info = VipsProcessor().probe(source=portrait, loader={"access": "random"})
+    assert info.format == "jpeg"
+
+
+def test_probe_directory(tmp_path):
+    shutil.copy(portrait, tmp_path / "portrait.jpg")
+    shutil.copy(alpha, tmp_path / "alpha.png")
+    (tmp_path / "notes.txt").write_text("not an image")
+    (tmp_path / "nested").mkdir()
+    shutil.copy(rotated, tmp_path / "nested" / "rotated.jpg")
+
+    infos = probe_directory(tmp_path, workers=2)
+    assert sorted(infos) == [
+        str(tmp_path / "alpha.png"),
+        str(tmp_path / "portrait.jpg"),
+    ]
+    assert infos[str(tmp_path / "alpha.png")].alpha
+
+    infos = probe_directory(tmp_path, "*.jpg", recursive=True)
+    assert infos[str(tmp_path / "nested" / "rotated.jpg")].width == 600
+
+
+def test_probe_requires_a_source():
+    with pytest.raises(ValueError):
+        ImageProcessing().probe()
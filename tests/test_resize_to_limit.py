@@ -2,6 +2,7 @@ import pytest
 
 from image_processing import ImageProcessing
 from image_processing.vips_processor import SHARPEN_MASK
+from image_processing.vips_processor import get_sharpen_mask
 
 from .utils import (
     assert_dimensions,
@@ -81,3 +82,34 @@ def test_accepts_sharpening_options(pipeline):
 def test_sharpening_uses_integer_precision(pipeline):
     sharpened_img = pipeline.resize_to_limit(400, 400).save(save=False)
     assert "uchar" == sharpened_img.format
+
+
+@pytest.mark.parametrize(
+    "sharpen",
+    ["mild", "unsharp", "separable", "sharpen", [[0, -1, 0], [-1, 5, -1], [0, -1, 0]]],
+)
+def test_accepts_sharpening_presets(pipeline, sharpen):
+    sharpened = pipeline.resize_to_limit(400, 400, sharpen=sharpen).save()
+    normal = pipeline.resize_to_limit(400, 400, sharpen="none").save()
+    assert_dimensions([300, 400], sharpened)
+    assert get_size(sharpened) > get_size(normal)
+
+
+def test_rejects_unknown_sharpening_presets(pipeline):
+    with pytest.raises(ValueError):
+        pipeline.resize_to_limit(400, 400, sharpen="extra").save()
+
+
+def test_sharpens_automatically_depending_on_the_scale(pipeline):
+    auto = pipeline.resize_to_limit(400, 400).save()
+    mild = pipeline.resize_to_limit(400, 400, sharpen="mild").save()
+    assert get_size(auto) == get_size(mild)
+
+    auto = pipeline.resize_to_limit(700, 700).save()
+    normal = pipeline.resize_to_limit(700, 700, sharpen="none").save()
+    assert get_size(auto) == get_size(normal)
+
+
+def test_caches_sharpening_masks():
+    kernel = ((0, -1, 0), (-1, 5, -1), (0, -1, 0))
+    assert get_sharpen_mask(kernel) is get_sharpen_mask(kernel)
@@ -1,4 +1,5 @@
 import pytest
+import pyvips
 
 from image_processing import ImageProcessing
 
@@ -56,3 +57,47 @@ def test_accepts_background_color(pipeline):
         [990, 990],
         pipeline.rotate(45, background=[0, 0, 0]).save()
     )
+
+
+def test_rotates_by_multiples_of_90_without_resampling(pipeline, monkeypatch):
+    def similarity(*args, **kw):
+        raise AssertionError("similarity() shouldn't be called")
+
+    monkeypatch.setattr(pyvips.Image, "similarity", similarity)
+    original = pyvips.Image.new_from_file(fixture_image("portrait.jpg"))
+    for degrees, expected in [(90, "d90"), (-90, "d270"), (540, "d180")]:
+        image = pipeline.rotate(degrees).save(save=False)
+        assert image.avg() == original.rot(expected).avg()
+        assert image.getpoint(0, 0) == original.rot(expected).getpoint(0, 0)
+
+
+def test_flips_after_rotating(pipeline):
+    original = pyvips.Image.new_from_file(fixture_image("portrait.jpg"))
+    image = pipeline.rotate(90, flip="horizontal").save(save=False)
+    expected = original.rot("d90").flip("horizontal")
+    assert (image.width, image.height) == (800, 600)
+    assert image.getpoint(10, 10) == expected.getpoint(10, 10)
+
+    image = pipeline.rotate(0, flip="vertical").save(save=False)
+    assert image.getpoint(10, 10) == original.flip("vertical").getpoint(10, 10)
+
+    with pytest.raises(ValueError):
+        pipeline.rotate(90, flip="diagonal").save()
+
+
+def test_accepts_interpolator(pipeline):
+    assert_dimensions(
+        [990, 990],
+        pipeline.rotate(45, interpolate="nearest").save()
+    )
+
+
+def test_rotates_images_with_alpha():
+    result = ImageProcessing(fixture_image("alpha.png")).rotate(45).save()
+    image = pyvips.Image.new_from_file(result)
+    assert image.bands == 4
+    assert image.getpoint(0, 0)[3] == 0
+
+    result = ImageProcessing(fixture_image("alpha.png")) \
+        .rotate(45, background=[255, 0, 0]).save()
+    assert pyvips.Image.new_from_file(result).getpoint(0, 0) == [255, 0, 0, 255]
@@ -0,0 +1,128 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from image_processing import ImageProcessing
+from image_processing import TempStore
+from image_processing import configure
+from image_processing import temp
+
+from .utils import fixture_image
+
+
+portrait = fixture_image("portrait.jpg")
+
+
+def test_copies_share_the_temp_folder(monkeypatch):
+    store = TempStore()
+    monkeypatch.setattr(temp, "_default_temp_store", store)
+
+    pipeline = ImageProcessing(portrait)
+    result1 = pipeline.resize_to_limit(400, 400).save()
+    result2 = pipeline.resize_to_limit(300, 300).save()
+    assert os.path.dirname(result1) == os.path.dirname(result2) == str(store.folder)
+    assert store.size == os.path.getsize(result1) + os.path.getsize(result2)
+    store.cleanup()
+    assert not os.path.exists(result1)
+
+
+def test_copies_keep_the_custom_temp_folder(tmp_path):
+    pipeline = ImageProcessing(portrait, temp_folder=tmp_path)
+    result = pipeline.resize_to_limit(400, 400).save()
+    assert os.path.dirname(result) == str(tmp_path)
+
+
+def test_removes_the_oldest_results_over_max_size(tmp_path):
+    store = TempStore(tmp_path, max_size=250)
+    paths = []
+    for name in ("a", "b", "c"):
+        path = store.get_path(name)
+        path.write_bytes(b"x" * 100)
+        store.add(path)
+        paths.append(path)
+    assert [path.exists() for path in paths] == [False, True, True]
+    assert store.size == 200
+
+
+def test_keeps_the_newest_result_over_max_size(tmp_path):
+    store = TempStore(tmp_path, max_size=10)
+    path = store.get_path("a")
+    path.write_bytes(b"x" * 100)
+    store.add(path)
+    assert path.exists()
+
+
+def test_child_processes_get_their_own_folder(monkeypatch, tmp_path):
+    store = TempStore(tmp_path)
+    folder = store.folder
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    assert store.folder != folder
+    assert folder.exists()
+
+
+def test_tmpfs(monkeypatch):
+    monkeypatch.setattr(os, "access", lambda path, mode: True)
+    assert TempStore(tmpfs=True).parent == temp.TMPFS_FOLDER
+    monkeypatch.setattr(os, "access", lambda path, mode: False)
+    assert TempStore(tmpfs=True).parent is None
+
+
+def test_configure_default_temp_store(monkeypatch):
+    monkeypatch.setattr(temp, "_default_temp_store", None)
+    configure(temp_max_size=1024)
+    assert temp.get_default_temp_store().max_size == 1024
+
+
+def test_identical_pipelines_never_expose_partial_results(tmp_path):
+    pipeline = ImageProcessing(portrait, temp_folder=tmp_path).resize_to_limit(
+        400, 400
+    )
+    path = pipeline.save()
+    size = os.path.getsize(path)
+    os.remove(path)
+    sizes = set()
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                sizes.add(os.path.getsize(path))
+            except FileNotFoundError:
+                pass
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda _: pipeline.save(), range(16)))
+    done.set()
+    reader.join()
+    assert set(results) == {path}
+    assert sizes <= {size}
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+
+def test_identical_save_many_branches_replace_the_temp_result(tmp_path):
+    pipeline = ImageProcessing(portrait, temp_folder=tmp_path)
+    branch = pipeline.resize_to_limit(300, 300)
+    first = pipeline.save_many({"small": branch})["small"]
+    second = pipeline.save_many({"small": branch})["small"]
+    assert first == second == branch.save()
+    assert os.listdir(tmp_path) == [os.path.basename(first)]
+
+
+def test_cleanup_at_exit_is_opt_in(monkeypatch):
+    registered = []
+    monkeypatch.setattr(temp.atexit, "register", registered.append)
+    TempStore()
+    assert registered == []
+    store = TempStore(cleanup_at_exit=True)
+    assert registered == [store.cleanup]
+
+
+def test_default_temp_store_is_limited_and_cleaned_up(monkeypatch):
+    registered = []
+    monkeypatch.setattr(temp.atexit, "register", registered.append)
+    monkeypatch.setattr(temp, "_default_temp_store", None)
+    store = temp.get_default_temp_store()
+    assert store.max_size == temp.DEFAULT_MAX_SIZE
+    assert registered == [store.cleanup]
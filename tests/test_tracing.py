@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+
+from image_processing import ImageProcessing
+from image_processing.tracing import CallbackTracer
+from image_processing.tracing import OpenTelemetryTracer
+from image_processing.tracing import get_mem_highwater
+
+from .utils import fixture_image
+from .utils import get_size
+
+
+portrait = fixture_image("portrait.jpg")
+
+
+def test_reports_every_stage():
+    stages = []
+
+    def callback(name, duration, attributes):
+        stages.append((name, duration, attributes))
+
+    pipeline = ImageProcessing(portrait, tracer=CallbackTracer(callback))
+    result = pipeline.invert().resize_to_limit(400, 400).save()
+
+    assert [name for name, _, _ in stages] == [
+        "load",
+        "operation.invert",
+        "operation.resize_to_limit",
+        "save",
+    ]
+    assert all(duration >= 0 for _, duration, _ in stages)
+
+    load, invert, resize, save = [attributes for _, _, attributes in stages]
+    assert load["width"] == 600
+    assert load["height"] == 800
+    assert load["shrink_on_load"] is False
+    assert resize["width"] == 300
+    assert resize["height"] == 400
+    assert save["bytes_written"] == get_size(result)
+    # Only reported when pyvips exposes it
+    assert save.get("mem_highwater", 1) > 0
+
+
+def test_reports_shrink_on_load():
+    stages = []
+    tracer = CallbackTracer(lambda *args: stages.append(args))
+    ImageProcessing(portrait, tracer=tracer).resize_to_limit(400, 400).save_to_buffer()
+
+    name, _, attributes = stages[0]
+    assert name == "load"
+    assert attributes == {
+        "shrink_on_load": True,
+        "width": 600,
+        "height": 800,
+        "bands": 3,
+    }
+    name, _, attributes = stages[-1]
+    assert name == "save"
+    assert attributes["bytes_written"] > 0
+
+
+def test_opentelemetry_tracer():
+    spans = []
+
+    class FakeSpan:
+        def __init__(self, name):
+            self.name = name
+            self.attributes = {}
+            spans.append(self)
+
+        def set_attribute(self, key, value):
+            self.attributes[key] = value
+
+    class FakeTracer:
+        @contextmanager
+        def start_as_current_span(self, name):
+            yield FakeSpan(name)
+
+    tracer = OpenTelemetryTracer(FakeTracer())
+    ImageProcessing(portrait, tracer=tracer).invert().save()
+    assert [span.name for span in spans] == [
+        "image_processing.load",
+        "image_processing.operation.invert",
+        "image_processing.save",
+    ]
+    assert spans[1].attributes["width"] == 600
+
+
+def test_get_mem_highwater(monkeypatch):
+    assert get_mem_highwater() is None or get_mem_highwater() > 0
+    monkeypatch.setattr(
+        "pyvips.tracked_get_mem_highwater", lambda: 1024, raising=False
+    )
+    assert get_mem_highwater() == 1024
@@ -1,6 +1,9 @@
 import pytest
 import pyvips
 from image_processing import ImageProcessing
+from image_processing.vips_processor import UnloadedImage
+from image_processing.vips_processor import VipsProcessor
+from image_processing.vips_processor import resolve_operation
 
 from .utils import (
     assert_dimensions,
@@ -118,3 +121,160 @@ def test_invalid_image_raises_error():
     with pytest.raises(pyvips.Error) as error:
         pipeline.save()
         assert "Corrupt JPEG data" in error.message
+
+
+def test_shrinks_on_load_when_starting_with_a_resize(monkeypatch):
+    calls = []
+    thumbnail = UnloadedImage.thumbnail
+
+    def spy(self, *args, **kw):
+        calls.append(self.source)
+        return thumbnail(self, *args, **kw)
+
+    monkeypatch.setattr(UnloadedImage, "thumbnail", spy)
+    result = ImageProcessing(portrait).resize_to_limit(400, 400).save()
+    assert calls == [portrait]
+    assert_dimensions([300, 400], result)
+
+    ImageProcessing(portrait).invert().resize_to_limit(400, 400).save()
+    assert calls == [portrait]
+
+
+def test_shrink_on_load_respects_autorotation():
+    rotated = fixture_image("rotated.jpg")
+
+    result = ImageProcessing(rotated).loader(autorot=False) \
+        .resize_to_limit(1000, 1000).save()
+    assert_dimensions([800, 600], result)
+
+    result = ImageProcessing(rotated).loader(fail=True, autorot=False) \
+        .resize_to_fill(400, 200).save()
+    assert_dimensions([400, 200], result)
+
+
+def test_shrink_on_load_doesnt_conflict_with_loader_shrink():
+    result = ImageProcessing(portrait).loader(shrink=2) \
+        .resize_to_limit(1000, 1000).save()
+    assert_dimensions([300, 400], result)
+
+
+def test_save_many_decodes_the_source_once(load_calls):
+    pipeline = ImageProcessing(portrait).invert()
+    results = pipeline.save_many({
+        "large": pipeline.resize_to_limit(400, 400),
+        "small": pipeline.resize_to_limit(150, 150).convert("png"),
+        "same": pipeline,
+    })
+    assert len(load_calls) == 1
+    assert_dimensions([300, 400], results["large"])
+    assert_dimensions([113, 150], results["small"])
+    assert_format("PNG", results["small"])
+    assert_dimensions([600, 800], results["same"])
+
+
+def test_save_many_shares_the_common_operations():
+    pipeline = ImageProcessing(portrait).resize_to_limit(400, 400)
+    results = pipeline.save_many({
+        "inverted": pipeline.invert(),
+        "rotated": pipeline.rotate(90),
+    })
+    assert_dimensions([300, 400], results["inverted"])
+    assert_dimensions([400, 300], results["rotated"])
+
+
+@pytest.fixture
+def load_calls(monkeypatch):
+    calls = []
+    load_image = VipsProcessor._load_image
+
+    def spy(self, source, **kw):
+        calls.append(kw.get("access"))
+        return load_image(self, source, **kw)
+
+    monkeypatch.setattr(VipsProcessor, "_load_image", spy)
+    return calls
+
+
+def test_uses_sequential_access_when_possible(load_calls):
+    result = ImageProcessing(portrait).invert().sharpen().save()
+    assert load_calls == ["sequential"]
+    assert_dimensions([600, 800], result)
+
+
+def test_uses_random_access_when_needed(load_calls):
+    result = ImageProcessing(portrait).invert().rotate(90).save()
+    assert load_calls == [None]
+    assert_dimensions([800, 600], result)
+
+
+def test_reloads_with_random_access_to_autorotate(load_calls):
+    result = ImageProcessing(fixture_image("rotated.jpg")).invert().save()
+    assert load_calls == ["sequential", None]
+    assert_dimensions([600, 800], result)
+
+    load_calls.clear()
+    result = ImageProcessing(fixture_image("rotated.jpg")) \
+        .loader(autorot=False).invert().save()
+    assert load_calls == ["sequential"]
+    assert_dimensions([800, 600], result)
+
+
+def test_respects_explicit_access(load_calls):
+    ImageProcessing(portrait).access("random").invert().save()
+    assert load_calls == ["random"]
+
+
+def test_uses_random_access_if_not_saving(load_calls):
+    image = ImageProcessing(portrait).invert().save(save=False)
+    assert load_calls == [None]
+    assert image.rot("d90").width == 800
+
+
+def test_resolve_operation():
+    assert resolve_operation(VipsProcessor, "resize_to_fit") is (
+        VipsProcessor.resize_to_fit
+    )
+    invert = resolve_operation(VipsProcessor, "invert")
+    image = pyvips.Image.black(2, 2)
+    assert invert(VipsProcessor(), image).avg() == 255
+    with pytest.raises(AttributeError):
+        resolve_operation(VipsProcessor, "resize_to_limt")
+    with pytest.raises(AttributeError):
+        resolve_operation(VipsProcessor, "_thumbnail")
+
+
+def test_save_with_max_bytes(tmp_path, load_calls):
+    pipeline = ImageProcessing(portrait).invert()
+    full_size = get_size(pipeline.save(tmp_path / "full.jpg"))
+
+    load_calls.clear()
+    result = pipeline.save(tmp_path / "small.jpg", max_bytes=full_size // 2)
+    assert get_size(result) <= full_size // 2
+    assert get_size(result) > full_size // 8
+    assert len(load_calls) == 1
+    assert_dimensions([600, 800], result)
+
+
+def test_save_with_max_bytes_keeps_the_quality_if_it_fits(tmp_path):
+    pipeline = ImageProcessing(portrait).resize_to_limit(400, 400).saver(quality=60)
+    expected = get_size(pipeline.save(tmp_path / "expected.jpg"))
+    result = pipeline.save(tmp_path / "result.jpg", max_bytes=10**9)
+    assert get_size(result) == expected
+
+
+def test_save_to_buffer_with_max_bytes():
+    pipeline = ImageProcessing(portrait).resize_to_limit(400, 400)
+    data = pipeline.saver(max_bytes=10000).save_to_buffer("webp")
+    assert len(data) <= 10000
+    assert data[8:12] == b"WEBP"
+
+
+def test_save_with_max_bytes_requires_a_lossy_format(load_calls):
+    with pytest.raises(ValueError):
+        ImageProcessing(portrait).convert("png").save(max_bytes=10000)
+    assert load_calls == []
+
+
+def test_save_with_max_bytes_fails_if_it_cant_fit():
+    with pytest.raises(ValueError):
+        ImageProcessing(portrait).saver(max_bytes=100).save_to_buffer("jpeg")